@@ -78,12 +78,13 @@ def pushBinary(build, binary, dstDir, skipIfMissing=False):
     if dstSum != srcSum:
         runOrExit(['adb', 'push', src, dst])
 
-def runRemote(build, dir, command, env):
+def remoteCommand(build, dir, command, env):
+    # Get a local command line that runs |command| on the device.
     env["LD_LIBRARY_PATH"] = DestPath + "build" + str(build.id)
     for key in env:
         command = [f"{key}={env[key]}"] + command
     command = ["cd", dir, "&&"] + command
-    return remoteShell(command)
+    return ['adb', 'shell'] + command
 
 def getMaxCpuFrequency():
     out, _ = remoteShell(['cat', '/sys/devices/system/cpu/cpu*/cpufreq/scaling_cur_freq'])
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+# Find the first build in an ordered range of builds that shows a change in a
+# result.
+#
+# The first build is assumed to be good and the last build bad. Each step
+# measures the build half way between the current good and bad anchors and
+# takes more samples until it can be distinguished from one of them at the
+# requested confidence. Samples are kept for the whole bisection so builds
+# measured at earlier steps are reused as anchors for later ones.
+#
+# Since the same comparison is tested again each time the number of samples is
+# doubled, the significance level is divided between the planned number of
+# looks so that stopping early doesn't inflate the false positive rate.
+
+from stats import Stats, compareStats
+
+class Step:
+    def __init__(self, build, isBad, stats, goodComp, badComp, confident):
+        self.build = build
+        self.isBad = isBad
+        self.stats = stats
+        self.goodComp = goodComp
+        self.badComp = badComp
+        self.confident = confident
+
+class Bisection:
+    def __init__(self,
+                 builds,
+                 key,
+                 measure,
+                 confidence=0.95,
+                 minSamples=5,
+                 maxSamples=50):
+        assert len(builds) >= 2
+        assert minSamples >= 2 and maxSamples >= minSamples
+        self.builds = builds
+        self.key = key
+        self.measure = measure
+        self.alpha = (1 - confidence) / self.plannedLooks(minSamples,
+                                                         maxSamples)
+        self.minSamples = minSamples
+        self.maxSamples = maxSamples
+        self.samples = dict()
+        self.steps = []
+        self.good = None
+        self.bad = None
+        self.endpointComp = None
+
+    def run(self, onStep=None):
+        # Returns the first bad build, or None if the endpoints can't be
+        # distinguished.
+        first, last = self.builds[0], self.builds[-1]
+        self.sample(first, self.minSamples)
+        self.sample(last, self.minSamples)
+        while True:
+            comp = self.compare(last, first)
+            if self.isSignificant(comp):
+                break
+            if not self.sampleMore(first, last):
+                self.endpointComp = comp
+                return None
+        self.endpointComp = comp
+
+        lo, hi = 0, len(self.builds) - 1
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            step = self.classify(self.builds[mid], self.builds[lo],
+                                 self.builds[hi])
+            self.steps.append(step)
+            if onStep:
+                onStep(step)
+            if step.isBad:
+                hi = mid
+            else:
+                lo = mid
+
+        self.good = self.builds[lo]
+        self.bad = self.builds[hi]
+        return self.bad
+
+    @staticmethod
+    def plannedLooks(minSamples, maxSamples):
+        # The number of sample counts a comparison can be tested at.
+        looks = 1
+        count = minSamples
+        while count < maxSamples:
+            count = min(count * 2, maxSamples)
+            looks += 1
+        return looks
+
+    def classify(self, build, good, bad):
+        self.sample(build, self.minSamples)
+        while True:
+            goodComp = self.compare(build, good)
+            badComp = self.compare(build, bad)
+            differsFromGood = self.isSignificant(goodComp)
+            differsFromBad = self.isSignificant(badComp)
+            isBad = self.isCloserToBad(build, good, bad)
+            if differsFromGood != differsFromBad:
+                # Only one of the anchors is distinguishable, so the build
+                # belongs with the other one.
+                return self.makeStep(build, differsFromGood, goodComp,
+                                     badComp, True)
+            if differsFromGood and differsFromBad:
+                # Intermediate result; go with the closer anchor.
+                return self.makeStep(build, isBad, goodComp, badComp, True)
+            if not self.sampleMore(build, good, bad):
+                return self.makeStep(build, isBad, goodComp, badComp, False)
+
+    def makeStep(self, build, isBad, goodComp, badComp, confident):
+        return Step(build, isBad, self.stats(build), goodComp, badComp,
+                    confident)
+
+    def sampleMore(self, build, *anchors):
+        # Double the number of samples for |build| and bring the anchors up
+        # to the same count. Returns False if we've hit the sample limit.
+        count = len(self.samples[build])
+        if count >= self.maxSamples:
+            return False
+        target = min(count * 2, self.maxSamples)
+        self.sample(build, target)
+        for anchor in anchors:
+            self.sample(anchor, target)
+        return True
+
+    def sample(self, build, count):
+        samples = self.samples.setdefault(build, [])
+        while len(samples) < count:
+            samples.extend(self.measure(build))
+
+    def stats(self, build):
+        return Stats(self.samples[build])
+
+    def compare(self, a, b):
+        return compareStats(self.stats(a), self.stats(b))
+
+    def isSignificant(self, comp):
+        return comp is not None and comp.pvalue is not None and \
+            comp.pvalue < self.alpha
+
+    def isCloserToBad(self, build, good, bad):
+        mean = self.stats(build).mean
+        return abs(mean - self.stats(bad).mean) < \
+            abs(mean - self.stats(good).mean)
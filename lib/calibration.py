@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# Estimate benchmark noise and the number of runs needed for a comparison.
+#
+# The baseline build is run repeatedly against itself. For each result key we
+# estimate the coefficient of variation and the lag-1 autocorrelation between
+# consecutive runs, which reduces the effective number of independent samples.
+# From that we work out how many runs per build are needed to detect a given
+# relative change with a given power, assuming a two sided test.
+#
+# Calibrations are cached per machine, shell binary, test and options.
+
+import hashlib
+import json
+import math
+import os
+import os.path
+import platform
+import statistics
+import time
+
+from staging import hashFile
+from stats import Stats, compareStats
+
+# Limit the correction for autocorrelation so a few very noisy samples don't
+# produce absurd plans.
+MaxAutocorrelation = 0.9
+
+class Noise:
+    def __init__(self, samples):
+        stats = Stats(samples)
+        self.count = stats.count
+        self.mean = stats.mean
+        self.cofv = stats.cofv
+        self.autocorrelation = autocorrelation(samples)
+
+        # Split alternate samples into two groups as an A/A comparison. This
+        # should not normally show a significant difference.
+        self.aaPValue = None
+        if self.count >= 4:
+            comp = compareStats(Stats(samples[0::2]), Stats(samples[1::2]))
+            if comp:
+                self.aaPValue = comp.pvalue
+
+    def varianceInflation(self):
+        # Variance of the mean of an AR(1) process relative to independent
+        # samples.
+        r = min(max(self.autocorrelation, 0), MaxAutocorrelation)
+        return (1 + r) / (1 - r)
+
+    def requiredRuns(self, minEffect, power, alpha):
+        # Runs per build to detect a relative change of |minEffect|.
+        if self.cofv == 0:
+            return 2
+        normal = statistics.NormalDist()
+        z = normal.inv_cdf(1 - alpha / 2) + normal.inv_cdf(power)
+        n = 2 * (z * self.cofv / minEffect)**2 * self.varianceInflation()
+        return max(math.ceil(n), 2)
+
+    def toJSON(self):
+        return self.__dict__
+
+    @staticmethod
+    def fromJSON(data):
+        noise = Noise.__new__(Noise)
+        noise.__dict__.update(data)
+        return noise
+
+def autocorrelation(samples):
+    count = len(samples)
+    if count < 3:
+        return 0
+    mean = statistics.mean(samples)
+    deviations = [x - mean for x in samples]
+    variance = sum(d * d for d in deviations)
+    if variance == 0:
+        return 0
+    covariance = sum(deviations[i] * deviations[i + 1]
+                     for i in range(count - 1))
+    return covariance / variance
+
+class Calibration:
+    def __init__(self, noise, runTime, timestamp):
+        self.noise = noise
+        self.runTime = runTime
+        self.timestamp = timestamp
+
+def calibrate(build, test, runs, measure):
+    # Run |build| |runs| times with |measure|, which returns the results of
+    # one run, and summarise the noise for every result key.
+    samples = dict()
+    runTimes = []
+    for i in range(runs):
+        start = time.perf_counter()
+        results = measure(build, test)
+        runTimes.append(time.perf_counter() - start)
+        for key, result in results.items():
+            values = result if isinstance(result, list) else [result]
+            samples.setdefault(key, []).extend(values)
+
+    noise = dict()
+    for key, values in samples.items():
+        if len(values) > 1:
+            noise[key] = Noise(values)
+    return Calibration(noise, statistics.mean(runTimes), time.time())
+
+def cacheDir():
+    root = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    return os.path.join(root, 'benchcomp', 'calibration')
+
+def cacheKey(build, test, runs, args):
+    # Anything that affects the results, including the machine.
+    parts = [
+        platform.node(),
+        platform.machine(),
+        platform.processor(),
+        hashFile(build.shell),
+        build.args,
+        test.name,
+        test.script,
+        test.args,
+        runs,
+        args.gc_profile,
+        args.sys_usage,
+        args.perf,
+        args.numa,
+    ]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+def loadCalibration(key):
+    path = os.path.join(cacheDir(), key + '.json')
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        noise = {k: Noise.fromJSON(v) for k, v in data['noise'].items()}
+        return Calibration(noise, data['runTime'], data['timestamp'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+def saveCalibration(key, calibration):
+    os.makedirs(cacheDir(), exist_ok=True)
+    data = {
+        'noise': {k: v.toJSON() for k, v in calibration.noise.items()},
+        'runTime': calibration.runTime,
+        'timestamp': calibration.timestamp
+    }
+    path = os.path.join(cacheDir(), key + '.json')
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+# Experimental designs for ordering benchmark runs.
+#
+# The random design shuffles the builds independently for every iteration and
+# treats all samples as independent.
+#
+# The blocked design runs every build back to back for each test in a block, so
+# that builds in the same block see similar machine state (temperature,
+# frequency scaling, background load). The order of builds within blocks
+# follows a Williams design, a Latin square in which every build is run first,
+# last and immediately after every other build equally often, which balances
+# out first order carryover effects. Each sample is tagged with its block so
+# that builds can be compared using paired differences.
+
+import random
+
+Designs = ('random', 'blocked')
+
+def williamsSquare(n):
+    # Return a list of orderings of range(n). For even n this has n rows. For
+    # odd n a single square can't balance carryover so its mirror image is
+    # added to make 2n rows.
+    first = [0]
+    low, high = 1, n - 1
+    while len(first) < n:
+        first.append(low)
+        low += 1
+        if len(first) < n:
+            first.append(high)
+            high -= 1
+
+    rows = [[(x + r) % n for x in first] for r in range(n)]
+    if n % 2 == 1:
+        rows += [list(reversed(row)) for row in rows]
+    return rows
+
+def randomRuns(builds, tests, iterations):
+    for i in range(iterations):
+        for build in shuffled(builds):
+            for test in shuffled(tests):
+                yield (build, test, {})
+
+def blockedRuns(builds, tests, iterations):
+    # Builds are randomly assigned to the square's labels once and the order
+    # of the rows is shuffled each time through the square.
+    labels = shuffled(builds)
+    square = williamsSquare(len(builds))
+    block = 0
+    rows = []
+    for i in range(iterations):
+        if not rows:
+            rows = shuffled(square)
+        row = rows.pop()
+        for test in shuffled(tests):
+            for index in row:
+                yield (labels[index], test, {'block': block})
+            block += 1
+
+def generateRuns(design, builds, tests, iterations):
+    # Generate (build, test, tag) tuples for the runs to perform, where tag is
+    # a dict of properties to record with the results.
+    if design == 'blocked':
+        return blockedRuns(builds, tests, iterations)
+    return randomRuns(builds, tests, iterations)
+
+def shuffled(list):
+    result = list.copy()
+    random.shuffle(result)
+    return result
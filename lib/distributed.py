@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+
+# Spread benchmark runs over several worker processes or hosts.
+#
+# A coordinator serves (build, test) work items to workers over TCP. Messages
+# are JSON objects, one per line. When a worker connects it is sent the session
+# options and recreates the builds and tests from them, so build and test paths
+# must be the same on every host. Workers then repeatedly ask for an item, run
+# it and send back the results:
+#
+#   worker -> coordinator: hello, ready, heartbeat, result, failed, skipped
+#   coordinator -> worker: session, work, done
+#
+# A failed message is sent for every failed attempt at running an item, which
+# the worker may retry. If it gives up it sends skipped instead of a result.
+# Workers keep their own retry and quarantine state.
+#
+# Each item handed out is leased to a worker. Workers send heartbeats while
+# connected, which renew their leases. If a worker disconnects or its lease
+# expires the item is put back at the front of the queue for another worker. If
+# a late result arrives for an item that has since completed it is ignored.
+#
+# Workers run one item at a time so that runs on the same host don't interfere
+# with each other.
+
+import asyncio
+import collections
+import json
+import os
+import platform
+import sys
+import time
+
+HeartbeatInterval = 5
+DefaultLeaseTimeout = 60
+ConnectTimeout = 60
+
+async def sendMessage(writer, message):
+    # Each message is written with a single call so that messages sent from
+    # different tasks don't interleave.
+    writer.write((json.dumps(message) + "\n").encode())
+    await writer.drain()
+
+async def readMessage(reader):
+    # Returns None at end of stream.
+    line = await reader.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+def log(message):
+    print(message, file=sys.stderr)
+
+class WorkItem:
+    def __init__(self, id, build, test, tag):
+        self.id = id
+        self.build = build
+        self.test = test
+        self.tag = tag
+
+class Lease:
+    def __init__(self, item, worker, timeout):
+        self.item = item
+        self.worker = worker
+        self.timeout = timeout
+        self.renew()
+
+    def renew(self):
+        self.deadline = time.monotonic() + self.timeout
+
+    def expired(self):
+        return time.monotonic() > self.deadline
+
+class Coordinator:
+    def __init__(self, builds, tests, testRuns, session, onResult, onFailed,
+                 leaseTimeout=DefaultLeaseTimeout):
+        # testRuns is a sequence of (build, test, tag). Results are passed to
+        # onResult(build, results, tag) with the name of the worker added to
+        # the tag, and failures to onFailed(build, test, message, quarantined).
+        self.builds = builds
+        self.testsByName = dict((test.name, test) for test in tests)
+        self.session = session
+        self.onResult = onResult
+        self.onFailed = onFailed
+        self.leaseTimeout = leaseTimeout
+
+        self.pending = collections.deque()
+        for id, (build, test, tag) in enumerate(testRuns):
+            self.pending.append(
+                WorkItem(id, builds.index(build), test.name, tag))
+        self.remaining = len(self.pending)
+        self.leases = dict()
+        self.completed = set()
+        self.workerNames = set()
+        self.changed = asyncio.Condition()
+
+    async def run(self, host, port):
+        server = await asyncio.start_server(self.serveWorker, host, port)
+        address = server.sockets[0].getsockname()
+        log(f"Coordinator waiting for workers on {address[0]}:{address[1]}")
+        expiry = asyncio.ensure_future(self.expireLeases())
+        try:
+            async with self.changed:
+                await self.changed.wait_for(lambda: self.remaining == 0)
+        finally:
+            expiry.cancel()
+            server.close()
+
+    async def serveWorker(self, reader, writer):
+        name = None
+        try:
+            hello = await readMessage(reader)
+            if not hello or hello.get('type') != 'hello':
+                return
+            name = self.uniqueName(hello.get('name', 'worker'))
+            log(f"Worker {name} connected")
+            await sendMessage(writer, {'type': 'session', 'args': self.session})
+            await self.serveRequests(name, reader, writer)
+        except (ConnectionError, ValueError) as e:
+            log(f"Worker {name or 'unknown'}: {e}")
+        finally:
+            if name:
+                await self.releaseLeases(name)
+                log(f"Worker {name} disconnected")
+            writer.close()
+
+    async def serveRequests(self, name, reader, writer):
+        while True:
+            message = await readMessage(reader)
+            if message is None:
+                return
+
+            kind = message.get('type')
+            if kind == 'heartbeat':
+                for lease in self.leases.values():
+                    if lease.worker == name:
+                        lease.renew()
+            elif kind == 'ready':
+                item = await self.nextItem(name)
+                if item is None:
+                    await sendMessage(writer, {'type': 'done'})
+                    return
+                await sendMessage(writer, {
+                    'type': 'work',
+                    'id': item.id,
+                    'build': item.build,
+                    'test': item.test
+                })
+            elif kind == 'result':
+                await self.complete(message['id'], name, message['results'])
+            elif kind == 'failed':
+                await self.fail(message['id'], name, message['error'],
+                                message['quarantined'])
+            elif kind == 'skipped':
+                async with self.changed:
+                    self.finish(message['id'])
+            else:
+                raise ValueError(f"Unexpected message: {kind}")
+
+    def uniqueName(self, name):
+        result = name
+        count = 2
+        while result in self.workerNames:
+            result = f"{name}#{count}"
+            count += 1
+        self.workerNames.add(result)
+        return result
+
+    async def nextItem(self, worker):
+        # Wait for an item to become available. Returns None when all items
+        # have completed.
+        async with self.changed:
+            await self.changed.wait_for(
+                lambda: self.pending or self.remaining == 0)
+            if self.remaining == 0:
+                return None
+            item = self.pending.popleft()
+            self.leases[item.id] = Lease(item, worker, self.leaseTimeout)
+            return item
+
+    async def complete(self, id, worker, results):
+        async with self.changed:
+            item = self.finish(id)
+            if item:
+                tag = dict(item.tag, worker=worker)
+                self.onResult(self.builds[item.build], results, tag)
+
+    async def fail(self, id, worker, message, quarantined):
+        lease = self.leases.get(id)
+        if lease and lease.worker == worker:
+            lease.renew()
+            item = lease.item
+            self.onFailed(self.builds[item.build],
+                          self.testsByName[item.test], message, quarantined)
+
+    def finish(self, id):
+        # Mark an item as completed and return it, or return None if it has
+        # already completed. Must be called with the condition held.
+        if id in self.completed:
+            return None  # Completed by another worker after a lease expired.
+
+        lease = self.leases.pop(id, None)
+        if lease:
+            item = lease.item
+        else:
+            item = next((i for i in self.pending if i.id == id), None)
+            if item is None:
+                return None
+            self.pending.remove(item)
+
+        self.completed.add(id)
+        self.remaining -= 1
+        self.changed.notify_all()
+        return item
+
+    async def releaseLeases(self, worker):
+        async with self.changed:
+            self.requeue([l for l in self.leases.values() if l.worker == worker])
+
+    async def expireLeases(self):
+        while True:
+            await asyncio.sleep(1)
+            async with self.changed:
+                expired = [l for l in self.leases.values() if l.expired()]
+                for lease in expired:
+                    log(f"Lease on item {lease.item.id} held by " +
+                        f"{lease.worker} expired")
+                self.requeue(expired)
+
+    def requeue(self, leases):
+        # Must be called with the condition held.
+        for lease in leases:
+            del self.leases[lease.item.id]
+            self.pending.appendleft(lease.item)
+        if leases:
+            self.changed.notify_all()
+
+async def runCoordinator(address, builds, tests, testRuns, session, onResult,
+                         onFailed, leaseTimeout=DefaultLeaseTimeout):
+    coordinator = Coordinator(builds, tests, testRuns, session, onResult,
+                              onFailed, leaseTimeout)
+    await coordinator.run(*address)
+
+async def runWorker(address, setupSession, runBenchmark):
+    # Run items from a coordinator until it says we're done. setupSession is
+    # called with the session options and returns (args, builds, tests).
+    # runBenchmark(build, test, args, onFailure) returns the results or None if
+    # it gave up, and calls onFailure(build, test, error, quarantined) for each
+    # failed attempt.
+    reader, writer = await connect(address)
+    name = f"{platform.node()}:{os.getpid()}"
+    await sendMessage(writer, {'type': 'hello', 'name': name})
+
+    session = await readMessage(reader)
+    if not session or session.get('type') != 'session':
+        sys.exit("Coordinator closed the connection")
+    args, builds, tests = setupSession(session['args'])
+    testsByName = dict((test.name, test) for test in tests)
+
+    heartbeat = asyncio.ensure_future(sendHeartbeats(writer))
+    runs = 0
+    try:
+        while True:
+            await sendMessage(writer, {'type': 'ready'})
+            message = await readMessage(reader)
+            if message is None or message.get('type') == 'done':
+                break
+
+            id = message['id']
+            build = builds[message['build']]
+            test = testsByName[message['test']]
+
+            def onFailure(build, test, error, quarantined):
+                failures.append({
+                    'type': 'failed',
+                    'id': id,
+                    'error': str(error),
+                    'quarantined': quarantined
+                })
+
+            failures = []
+            results = await runBenchmark(build, test, args, onFailure)
+            for failure in failures:
+                await sendMessage(writer, failure)
+            if not results:
+                await sendMessage(writer, {'type': 'skipped', 'id': id})
+                continue
+            await sendMessage(writer, {
+                'type': 'result',
+                'id': id,
+                'results': results
+            })
+            runs += 1
+    finally:
+        heartbeat.cancel()
+        writer.close()
+
+    log(f"Worker finished after {runs} runs")
+
+async def connect(address):
+    # Retry for a while so workers can be started before the coordinator.
+    host, port = address
+    deadline = time.monotonic() + ConnectTimeout
+    while True:
+        try:
+            return await asyncio.open_connection(host, port)
+        except OSError as e:
+            if time.monotonic() > deadline:
+                sys.exit(f"Can't connect to coordinator at {host}:{port}: {e}")
+            await asyncio.sleep(1)
+
+async def sendHeartbeats(writer):
+    while True:
+        await asyncio.sleep(HeartbeatInterval)
+        await sendMessage(writer, {'type': 'heartbeat'})
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+# Measure the energy used during benchmark runs with the Linux powercap
+# interface to the CPU's RAPL (running average power limit) energy counters.
+#
+# The package and DRAM domains of every socket are read. The counters cover the
+# whole machine, not just the benchmark process, so background activity is
+# included in the results.
+#
+# Each counter wraps around at its max_energy_range_uj. On some machines this
+# happens after less than a minute at full power, so the counters are polled
+# while a run is in progress to catch every wraparound.
+#
+# Reading the counters usually needs root as they can leak information about
+# other processes. If they can't be read a warning is printed and energy is not
+# reported.
+
+import os
+import os.path
+import re
+import sys
+import threading
+import time
+
+DefaultPowercapRoot = '/sys/class/powercap'
+PollInterval = 1
+
+# Zones are named intel-rapl:<socket> with subzones intel-rapl:<socket>:<n>, on
+# AMD as well as Intel. The intel-rapl-mmio zones duplicate the package zones
+# and are not used.
+ZoneDirPattern = re.compile(r'intel-rapl:\d+(:\d+)?$')
+
+def energyKey(testName, domain):
+    return f'{testName} energy {domain} / J'
+
+def powerKey(testName, domain):
+    return f'{testName} average power {domain} / W'
+
+def domainForZone(name):
+    # Zones are named package-<n>, dram, core, uncore or psys.
+    if name.startswith('package'):
+        return 'package'
+    if name == 'dram':
+        return 'dram'
+    return None
+
+class Zone:
+    def __init__(self, dir, domain, maxRange):
+        self.path = os.path.join(dir, 'energy_uj')
+        self.domain = domain
+        self.maxRange = maxRange
+
+    def read(self):
+        with open(self.path) as f:
+            return int(f.read())
+
+class Powercap:
+    def __init__(self, root=DefaultPowercapRoot):
+        self.root = root
+        self.zones = None
+        self.enabled = True
+
+    def findZones(self):
+        try:
+            entries = sorted(os.listdir(self.root))
+        except OSError as e:
+            self.disable(f"can't read {self.root}: {e.strerror}")
+            return
+
+        zones = []
+        for entry in entries:
+            if not ZoneDirPattern.match(entry):
+                continue
+            dir = os.path.join(self.root, entry)
+            try:
+                domain = domainForZone(readFile(dir, 'name'))
+                if not domain:
+                    continue
+                maxRange = int(readFile(dir, 'max_energy_range_uj'))
+                zone = Zone(dir, domain, maxRange)
+                zone.read()
+            except PermissionError as e:
+                self.disable(f"no permission to read {e.filename}")
+                return
+            except (OSError, ValueError):
+                continue
+            zones.append(zone)
+
+        if not zones:
+            self.disable(f"no RAPL package or DRAM zones found in {self.root}")
+            return
+
+        self.zones = zones
+
+    def createMeter(self, testName):
+        if self.zones is None and self.enabled:
+            self.findZones()
+        if not self.enabled:
+            return None
+        return EnergyMeter(self.zones, testName)
+
+    def disable(self, reason):
+        print(f"Warning: not measuring energy: {reason}", file=sys.stderr)
+        self.enabled = False
+
+class EnergyMeter:
+    # Measures the energy used by each domain between start() and stop(). The
+    # results are the total for all sockets.
+    def __init__(self, zones, testName):
+        self.zones = zones
+        self.testName = testName
+        self.thread = None
+        self.stopping = threading.Event()
+
+    def start(self, pid=None):
+        self.last = [zone.read() for zone in self.zones]
+        self.totals = [0] * len(self.zones)
+        self.startTime = time.perf_counter()
+        self.elapsed = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+        self.elapsed = time.perf_counter() - self.startTime
+        self.poll()
+
+    def run(self):
+        while not self.stopping.wait(PollInterval):
+            self.poll()
+
+    def poll(self):
+        for i, zone in enumerate(self.zones):
+            try:
+                value = zone.read()
+            except (OSError, ValueError):
+                continue
+            delta = value - self.last[i]
+            if delta < 0:
+                delta += zone.maxRange
+            self.totals[i] += delta
+            self.last[i] = value
+
+    def addResults(self, results):
+        if not self.elapsed:
+            return
+
+        energy = dict()
+        for zone, total in zip(self.zones, self.totals):
+            energy[zone.domain] = energy.get(zone.domain, 0) + total
+
+        for domain, microjoules in energy.items():
+            joules = microjoules / 1e6
+            results[energyKey(self.testName, domain)] = joules
+            results[powerKey(self.testName, domain)] = joules / self.elapsed
+
+def readFile(dir, name):
+    with open(os.path.join(dir, name)) as f:
+        return f.read().strip()
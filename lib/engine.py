@@ -0,0 +1,502 @@
+# -*- coding: utf-8 -*-
+
+# Run benchmarks as asyncio subprocesses.
+#
+# Each run gets its own working directory and optional timeout, and output is
+# read line by line as it is produced. Failures are reported by raising
+# BenchmarkError rather than exiting so that callers can decide what to do.
+
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import android
+import energy
+from output import parseOutput
+from perf import updateCommandForPerf
+import rusage
+import selfprofile
+from sampler import Sampler
+import startup
+from test import StartupTest
+from threadcpu import DefaultThreadGroups, ThreadSampler
+
+ReadChunkSize = 65536
+
+class BenchmarkError(Exception):
+    def __init__(self, build, test, command, message, output=''):
+        super().__init__(message)
+        self.build = build
+        self.test = test
+        self.command = command
+        self.message = message
+        self.output = output
+
+    def __str__(self):
+        text = f"Error running benchmark {self.test.name} with shell " + \
+            f"{self.build.shell}:\n{' '.join(self.command)}\n{self.message}"
+        if self.output:
+            text += "\n" + self.output
+        return text
+
+class RunOutput:
+    def __init__(self, command, returncode, stdout, stderr, elapsed, timedOut):
+        self.command = command
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.elapsed = elapsed
+        self.timedOut = timedOut
+        self.rusage = None
+        self.cgroupStats = None
+        self.monitors = []
+
+def prepareCommand(build, test, args):
+    cmd = [build.shell] + build.args + [test.script] + test.args
+    env = dict()
+
+    profilePath = None
+    if args.gc_profile:
+        if args.android:
+            profilePath = android.getProfilePath()
+        else:
+            temp = tempfile.NamedTemporaryFile(delete=False)
+            temp.close()
+            profilePath = temp.name
+        env['JS_GC_PROFILE'] = '0'
+        env['JS_GC_PROFILE_NURSERY'] = '0'
+        env['JS_GC_PROFILE_FILE'] = profilePath
+
+    if args.numa:
+        cmd = ['numactl', '--cpunodebind=1', '--localalloc', '--'] + cmd
+
+    # Resource usage is read directly for local runs.
+    if args.sys_usage and args.android:
+        cmd = ['/system/bin/time', '-v'] + cmd
+    elif args.perf:
+        cmd = updateCommandForPerf(args, cmd)
+
+    return cmd, env, profilePath
+
+async def runCommand(cmd,
+                     cwd=None,
+                     env=None,
+                     timeout=None,
+                     onLine=None,
+                     cgroup=None,
+                     monitors=[]):
+    # Run a command and collect its output. If |onLine| is passed it is called
+    # with the stream name and text of each line as it is read. If |cgroup| is
+    # passed the command is run inside it. |monitors| are started with the
+    # process ID once the process has started and stopped when it exits.
+    if not hasattr(os, 'wait4'):
+        return await runCommandWithoutRusage(cmd, cwd, env, timeout, onLine,
+                                             monitors)
+
+    # Spawn the process through the launcher, which reaps it with wait4 and
+    # reports its resource usage. asyncio's child watcher doesn't provide this.
+    # It gets its own process group so that wrappers' children can be killed
+    # too.
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    spawnCmd = cgroup.wrapCommand(cmd) if cgroup else cmd
+    with selfprofile.phase('spawn process'):
+        proc, report = rusage.spawnWithLauncher(spawnCmd,
+                                                cwd=cwd,
+                                                env=env,
+                                                stdout=subprocess.PIPE,
+                                                stderr=subprocess.PIPE,
+                                                start_new_session=True)
+    exited = loop.run_in_executor(None, os.wait4, proc.pid, 0)
+
+    stdoutLines = []
+    stderrLines = []
+    started = []
+    transports = []
+    timedOut = False
+    try:
+        # Monitors watch the command rather than the launcher.
+        pid = await loop.run_in_executor(None, report.readPid)
+        if pid:
+            for monitor in monitors:
+                monitor.start(pid)
+                started.append(monitor)
+
+        stdout, transport = await openPipe(proc.stdout)
+        transports.append(transport)
+        stderr, transport = await openPipe(proc.stderr)
+        transports.append(transport)
+        readers = asyncio.gather(
+            readLines(stdout, 'stdout', stdoutLines, onLine),
+            readLines(stderr, 'stderr', stderrLines, onLine),
+            asyncio.shield(exited))
+
+        try:
+            await asyncio.wait_for(readers, timeout)
+        except asyncio.TimeoutError:
+            timedOut = True
+    finally:
+        # Always clean up, even if reading the output failed. This also kills
+        # anything the command left running in the background.
+        killProcessGroup(proc.pid)
+        _, status, _ = await exited
+        elapsed = time.perf_counter() - start
+        for monitor in started:
+            monitor.stop()
+        for transport in transports:
+            transport.close()
+
+    report.readAll()
+    if report.status is not None:
+        status = report.status
+        elapsed = report.elapsed
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    output = RunOutput(cmd, proc.returncode, ''.join(stdoutLines),
+                       ''.join(stderrLines), elapsed, timedOut)
+    output.rusage = report.usage
+    return output
+
+async def openPipe(pipe):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    transport, _ = await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    return reader, transport
+
+async def runCommandWithoutRusage(cmd, cwd, env, timeout, onLine, monitors):
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        cwd=cwd,
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True)
+    stdoutLines = []
+    stderrLines = []
+    started = []
+    timedOut = False
+    try:
+        for monitor in monitors:
+            monitor.start(proc.pid)
+            started.append(monitor)
+
+        readers = asyncio.gather(
+            readLines(proc.stdout, 'stdout', stdoutLines, onLine),
+            readLines(proc.stderr, 'stderr', stderrLines, onLine),
+            proc.wait())
+        try:
+            await asyncio.wait_for(readers, timeout)
+        except asyncio.TimeoutError:
+            timedOut = True
+    finally:
+        killProcessGroup(proc.pid)
+        await proc.wait()
+        elapsed = time.perf_counter() - start
+        for monitor in started:
+            monitor.stop()
+
+    return RunOutput(cmd, proc.returncode, ''.join(stdoutLines),
+                     ''.join(stderrLines), elapsed, timedOut)
+
+def killProcessGroup(pid):
+    # Kill a process started with start_new_session and anything it started,
+    # e.g. a background process that is keeping its output open. This is
+    # safe even if the process has been reaped, since its ID can't be reused
+    # while any process remains in its group.
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+async def readLines(stream, name, lines, onLine):
+    # Read in chunks rather than with readline, which fails for lines longer
+    # than the stream's limit.
+    partial = []
+    while True:
+        chunk = await stream.read(ReadChunkSize)
+        if not chunk:
+            break
+        *complete, rest = chunk.split(b'\n')
+        for part in complete:
+            partial.append(part)
+            partial.append(b'\n')
+            addLine(b''.join(partial), name, lines, onLine)
+            partial = []
+        if rest:
+            partial.append(rest)
+    if partial:
+        addLine(b''.join(partial), name, lines, onLine)
+
+def addLine(line, name, lines, onLine):
+    line = line.decode(errors='replace')
+    lines.append(line)
+    if onLine:
+        onLine(name, line)
+
+async def runBenchmarkCommand(build, test, args, timeout=None, onLine=None):
+    # Run a benchmark and return the RunOutput and profile path if any.
+    with selfprofile.phase('prepare command'):
+        cmd, env, profilePath = prepareCommand(build, test, args)
+
+    if not args.android:
+        # On Android pausing scales down CPU frequency for inactivity.
+        with selfprofile.phase('sleep before run'):
+            await asyncio.sleep(0.2)
+
+    cwd = test.dir
+    cgroup = None
+    monitors = []
+    if args.android:
+        cmd = android.remoteCommand(build, test.dir, cmd, env)
+        cwd, env = None, None
+    else:
+        if getattr(args, 'cgroup', None) is not None:
+            cgroup = getCgroupFactory(args.cgroup).create()
+        if getattr(args, 'sample_rate', None):
+            monitors.append(Sampler(args.sample_rate, not args.no_sample_pss))
+        if getattr(args, 'thread_cpu', False):
+            groups = args.thread_group or DefaultThreadGroups
+            monitors.append(ThreadSampler(args.thread_sample_rate, groups))
+        if getattr(args, 'energy', False):
+            meter = getPowercap(args.powercap_root).createMeter(test.name)
+            if meter:
+                monitors.append(meter)
+
+    try:
+        output = await runCommand(cmd,
+                                  cwd=cwd,
+                                  env=env,
+                                  timeout=timeout,
+                                  onLine=onLine,
+                                  cgroup=cgroup,
+                                  monitors=monitors)
+    except OSError as e:
+        if profilePath and not args.android:
+            os.remove(profilePath)
+        raise BenchmarkError(build, test, cmd, f"Failed to start command: {e}")
+    finally:
+        if cgroup:
+            cgroupStats = cgroup.readStats()
+            cgroup.remove()
+    if cgroup:
+        output.cgroupStats = cgroupStats
+    output.monitors = monitors
+    selfprofile.addBenchmarkTime(output.elapsed)
+
+    if getattr(args, 'sample_timelines', None):
+        for monitor in monitors:
+            if hasattr(monitor, 'writeTimeline'):
+                writeTimeline(monitor, build, test, args.sample_timelines)
+
+    if output.timedOut or output.returncode != 0:
+        if profilePath and not args.android:
+            os.remove(profilePath)
+        if output.timedOut:
+            message = f"Command timed out after {timeout} seconds"
+        else:
+            message = f"Command exited with return code {output.returncode}"
+        raise BenchmarkError(build, test, cmd, message, output.stderr)
+
+    return output, profilePath
+
+async def runBenchmark(build, test, args, timeout=None):
+    # Run a benchmark and return the parsed results.
+    if isinstance(test, StartupTest):
+        return await runStartupBenchmark(build, test, args, timeout)
+
+    output, profilePath = await runBenchmarkCommand(build, test, args, timeout)
+    with selfprofile.phase('parse output'):
+        try:
+            results = parseOutput(output.stdout, output.stderr, args,
+                                  profilePath)
+        except Exception as e:
+            # Includes assertion failures for malformed GC profiles.
+            raise BenchmarkError(build, test, output.command,
+                                 f"Failed to parse output: {e!r}",
+                                 output.stdout + output.stderr)
+        addResourceUsage(results, output, args)
+    if not results:
+        raise BenchmarkError(build, test, output.command,
+                             "Failed to parse any result from output",
+                             output.stdout + output.stderr)
+    return results
+
+DefaultStartupLaunches = 20
+WarnedPageCache = False
+
+async def runStartupBenchmark(build, test, args, timeout=None):
+    # Launch the shell repeatedly and time each launch. Each launch's time and
+    # resource usage are separate samples.
+    if args.android:
+        raise BenchmarkError(build, test, [build.shell],
+                             "Startup tests are not supported on Android")
+
+    cmd = [build.shell] + build.args
+    if test.isModule:
+        cmd += ['--module', test.script]
+    else:
+        cmd.append(test.script)
+    cmd += test.args
+
+    launches = getattr(args, 'startup_launches', DefaultStartupLaunches)
+    evictPaths = None
+    if getattr(args, 'page_cache', 'warm') == 'cold':
+        if startup.canEvictFromPageCache():
+            evictPaths = startup.filesToEvict(build, test)
+        else:
+            global WarnedPageCache
+            if not WarnedPageCache:
+                print("Warning: can't evict files from the page cache on " +
+                      "this platform", file=sys.stderr)
+                WarnedPageCache = True
+
+    meter = None
+    if getattr(args, 'energy', False):
+        meter = getPowercap(args.powercap_root).createMeter(test.name)
+
+    # Launching is done on a separate thread to keep the overhead of each
+    # launch low and consistent.
+    loop = asyncio.get_running_loop()
+    if meter:
+        meter.start()
+    try:
+        samples = await loop.run_in_executor(None, launchRepeatedly, build,
+                                             test, cmd, launches, evictPaths,
+                                             timeout)
+    finally:
+        if meter:
+            meter.stop()
+    selfprofile.addBenchmarkTime(sum(elapsed for elapsed, _ in samples))
+
+    name = test.name
+    results = dict()
+    results[f'!{name} / ms'] = [elapsed * 1000 for elapsed, _ in samples]
+    usages = [usage for _, usage in samples if usage]
+    if usages:
+        results[f'{name} user time / ms'] = \
+            [u.ru_utime * 1000 for u in usages]
+        results[f'{name} system time / ms'] = \
+            [u.ru_stime * 1000 for u in usages]
+        results[f'{name} max RSS / KB'] = [rusage.maxRssKB(u) for u in usages]
+        results[f'{name} minor page faults'] = [u.ru_minflt for u in usages]
+        results[f'{name} major page faults'] = [u.ru_majflt for u in usages]
+    if meter:
+        meter.addResults(results)
+    return results
+
+def launchRepeatedly(build, test, cmd, count, evictPaths, timeout):
+    # With a warm page cache the first launch is not timed.
+    deadline = time.perf_counter() + timeout if timeout else None
+    warmUp = 0 if evictPaths else 1
+    samples = []
+    for i in range(warmUp + count):
+        if evictPaths:
+            startup.evictFromPageCache(evictPaths)
+        sample = launchOnce(build, test, cmd, deadline)
+        if i >= warmUp:
+            samples.append(sample)
+    return samples
+
+def launchOnce(build, test, cmd, deadline):
+    # Returns the elapsed time and resource usage, if available.
+    useLauncher = hasattr(os, 'wait4') and hasattr(os, 'waitid')
+    with tempfile.TemporaryFile() as errors:
+        start = time.perf_counter()
+        spawn = rusage.spawnWithLauncher if useLauncher else subprocess.Popen
+        try:
+            launched = spawn(cmd,
+                             cwd=test.dir,
+                             stdin=subprocess.DEVNULL,
+                             stdout=subprocess.DEVNULL,
+                             stderr=errors,
+                             start_new_session=True)
+        except OSError as e:
+            raise BenchmarkError(build, test, cmd,
+                                 f"Failed to start command: {e}")
+
+        usage = None
+        if useLauncher:
+            proc, report = launched
+            timer = None
+            if deadline:
+                timer = threading.Timer(max(deadline - time.perf_counter(), 0),
+                                        killProcessGroup, (proc.pid,))
+                timer.start()
+
+            # Wait for the launcher to exit without reaping it so that its PID
+            # can't be reused before the timer is cancelled.
+            os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+            elapsed = time.perf_counter() - start
+            if timer:
+                timer.cancel()
+                timer.join()
+
+            _, status, _ = os.wait4(proc.pid, 0)
+            try:
+                report.readAll()
+            except OSError as e:
+                raise BenchmarkError(build, test, cmd,
+                                     f"Failed to start command: {e}")
+            if report.status is not None:
+                # Time the command alone, not the launcher's startup.
+                status = report.status
+                elapsed = report.elapsed
+                usage = report.usage
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            proc = launched
+            try:
+                proc.wait(max(deadline - time.perf_counter(), 0)
+                          if deadline else None)
+            except subprocess.TimeoutExpired:
+                killProcessGroup(proc.pid)
+                proc.wait()
+            elapsed = time.perf_counter() - start
+
+        if proc.returncode != 0:
+            if deadline and time.perf_counter() >= deadline:
+                message = "Command timed out"
+            else:
+                message = f"Command exited with return code {proc.returncode}"
+            errors.seek(0)
+            raise BenchmarkError(build, test, cmd, message,
+                                 errors.read().decode(errors='replace'))
+
+    return elapsed, usage
+
+def addResourceUsage(results, output, args):
+    if args.sys_usage and output.rusage:
+        rusage.addRusageResults(results, output.rusage, output.elapsed)
+    if output.cgroupStats:
+        rusage.addCgroupResults(results, output.cgroupStats)
+    for monitor in output.monitors:
+        monitor.addResults(results)
+
+def writeTimeline(sampler, build, test, dir):
+    os.makedirs(dir, exist_ok=True)
+    name = f"{build.name}-{build.id}-{os.path.basename(test.name)}"
+    fd, path = tempfile.mkstemp(dir=dir, prefix=name + '-', suffix='.json')
+    os.close(fd)
+    sampler.writeTimeline(path)
+
+SharedPowercap = None
+
+def getPowercap(root):
+    global SharedPowercap
+    if not SharedPowercap:
+        SharedPowercap = energy.Powercap(root)
+    return SharedPowercap
+
+SharedCgroupFactory = None
+
+def getCgroupFactory(parent):
+    global SharedCgroupFactory
+    if not SharedCgroupFactory:
+        SharedCgroupFactory = rusage.CgroupFactory(parent)
+    return SharedCgroupFactory
@@ -1,33 +1,80 @@
 # gcprofile
 #
 # Summarise GC profiling information from log data.
+#
+# Logs may contain profiles from several runtimes in several processes, for
+# example a browser's parent, content and worker runtimes. Data is summarised
+# for all runtimes together and with the 'processes' category also for each
+# role and for the most active runtimes of each role.
+#
+# Logs can be split into phases by marker lines matching regular expressions.
+# Each marker starts the named phase, or ends the current phase if the name is
+# empty, and data is also summarised separately for each phase.
 
 import math
 import re
+import sys
 
 # Detect whether we're currently running a raptor test, or between
 # tests.
 StartTestText = 'Testing url'
 EndTestText = 'PageCompleteCheck returned true'
 
-def summariseProfile(text, result, categories, filterMostActiveRuntime=True):
-    majorFields, majorData, minorFields, minorData, testCount = parseOutput(
-        text)
+DefaultPhaseMarkers = [('test', re.escape(StartTestText)),
+                       ('', re.escape(EndTestText))]
+
+# Process type markers in browser log prefixes, e.g. '[Parent 1234: Main
+# Thread]'.
+ProcessMarker = re.compile(r'\[(Parent|Child|GPU|RDD|Socket|Utility)\b')
+ProcessRoles = {'Parent': 'parent', 'Child': 'content'}
+
+# Runtimes within a process other than the main one are assumed to be workers.
+WorkerRole = 'worker'
+
+# How many runtimes of each role to summarise individually.
+MaxRuntimesPerRole = 3
+
+def parsePhaseMarker(spec):
+    # Parse a NAME=REGEX phase marker.
+    name, sep, pattern = spec.partition('=')
+    if not sep or not pattern:
+        raise ValueError(f"Bad phase marker: {spec}")
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"Bad phase marker pattern: {e}")
+    return (name, pattern)
+
+def summariseProfile(text,
+                     result,
+                     categories,
+                     filterMostActiveRuntime=True,
+                     phaseMarkers=DefaultPhaseMarkers):
+    majorFields, majorData, minorFields, minorData, phases = parseOutput(
+        text, phaseMarkers)
 
+    groups = groupByRuntime(majorData, minorData)
     if filterMostActiveRuntime:
         runtime = findMostActiveRuntimeByFrequency(majorData + minorData)
-        majorData = filterByRuntime(majorData, runtime)
-        minorData = filterByRuntime(minorData, runtime)
+        groups = {runtime: groups[runtime]}
 
-    removeShutdownGCs(majorFields, majorData, minorFields, minorData)
+    # Each runtime has its own shutdown GCs.
+    for group in groups.values():
+        removeShutdownGCs(majorFields, group.majorData, minorFields,
+                          group.minorData)
+    majorData, minorData = mergeGroups(groups.values(), majorData, minorData)
 
     if 'major' in categories:
         countMajorGCs(result, majorFields, majorData)
 
     summariseAllData(result, majorFields, majorData, minorFields, minorData, categories)
-    if testCount != 0:
-        summariseAllDataByInTest(result, majorFields, majorData, minorFields,
-                                 minorData, categories, True)
+    for phase in phases:
+        summariseAllDataByPhase(result, majorFields, majorData, minorFields,
+                                minorData, categories, phase)
+
+    if 'processes' in categories:
+        classifyRuntimes(majorFields, groups)
+        summariseRuntimes(result, majorFields, minorFields, groups, categories)
 
     if 'major' in categories:
         # Useful for scheduling changes only.
@@ -133,33 +180,33 @@ def extractHeapSizeData(text):
 
     return runtimes
 
-def parseOutput(text):
+def parseOutput(text, phaseMarkers=DefaultPhaseMarkers):
+    # Returns the fields and data for major and minor GCs and the names of the
+    # phases seen. Profile lines are first collected with the phase and
+    # process type they belong to and then split into fields.
     majorFields = None
     majorSpans = None
-    majorData = list()
+    majorLines = list()
     minorFields = None
     minorSpans = None
-    minorData = list()
+    minorLines = list()
 
-    inTest = False
-    testCount = 0
-    testNum = 0
+    markers = [(name, re.compile(pattern)) for name, pattern in phaseMarkers]
+    phase = ''
+    phases = list()
 
-    for line in text.splitlines():
-        if StartTestText in line:
-            assert not inTest
-            inTest = True
-            testCount += 1
-            testNum = testCount
-            continue
+    # Prefixes repeat so cache the process type for each one.
+    processTypes = dict()
 
-        if inTest and EndTestText in line:
-            inTest = False
-            testNum = 0
-            continue
+    def processTypeFor(prefix):
+        result = processTypes.get(prefix)
+        if result is None:
+            result = processTypes[prefix] = processType(prefix)
+        return result
 
+    for line in text.splitlines():
         if 'MajorGC:' in line:
-            line = line.split('MajorGC: ', maxsplit=1)[1]
+            prefix, line = line.split('MajorGC: ', maxsplit=1)
 
             if 'TOTALS:' in line:
                 continue
@@ -167,19 +214,12 @@ def parseOutput(text):
                 if not majorFields:
                     majorFields, majorSpans = parseHeaderLine(line)
                 continue
-            else:
-                fields = splitWithSpans(line, majorSpans)
-
-            fields.append(testNum)
-            if len(fields) != len(majorFields):
-                print("Skipping garbled profile line")
-                continue
 
-            majorData.append(fields)
+            majorLines.append((line, phase, processTypeFor(prefix)))
             continue
 
         if 'MinorGC:' in line:
-            line = line.split('MinorGC: ', maxsplit=1)[1]
+            prefix, line = line.split('MinorGC: ', maxsplit=1)
 
             if 'TOTALS:' in line:
                 continue
@@ -187,21 +227,42 @@ def parseOutput(text):
                 if not minorFields:
                     minorFields, minorSpans = parseHeaderLine(line)
                 continue
-            else:
-                fields = splitWithSpans(line, minorSpans)
-
-            fields.append(testNum)
-            if len(fields) != len(minorFields):
-                print("Skipping garbled profile line")
-                continue
 
-            minorData.append(fields)
+            minorLines.append((line, phase, processTypeFor(prefix)))
             continue
 
-    assert len(minorData) != 0 or len(
-        majorData) != 0, "No profile data present"
-
-    return majorFields, majorData, minorFields, minorData, testCount
+        for name, regexp in markers:
+            if regexp.search(line):
+                phase = name
+                if name and name not in phases:
+                    phases.append(name)
+                break
+
+    assert len(minorLines) != 0 or len(
+        majorLines) != 0, "No profile data present"
+
+    majorData = splitLines(majorLines, majorFields, majorSpans)
+    minorData = splitLines(minorLines, minorFields, minorSpans)
+
+    return majorFields, majorData, minorFields, minorData, phases
+
+def processType(prefix):
+    if not prefix:
+        return ''
+    match = ProcessMarker.search(prefix)
+    return match.group(1) if match else ''
+
+def splitLines(lines, fieldMap, spans):
+    data = list()
+    for line, phase, process in lines:
+        fields = splitWithSpans(line, spans)
+        fields.append(phase)
+        fields.append(process)
+        if len(fields) != len(fieldMap):
+            print("Skipping garbled profile line")
+            continue
+        data.append(fields)
+    return data
 
 def parseHeaderLine(line):
     fieldMap = dict()
@@ -217,28 +278,120 @@ def parseHeaderLine(line):
     assert fieldMap.get('PID') == 0
     assert fieldMap.get('Runtime') == 1
 
-    # Add our generated field:
-    fieldMap['testNum'] = len(fieldMap)
+    # Add our generated fields:
+    fieldMap['phase'] = len(fieldMap)
+    fieldMap['process'] = len(fieldMap)
 
     return fieldMap, fieldSpans
 
 def splitWithSpans(line, spans):
-    fields = []
-    for span in spans:
-        field = line[span[0]:span[1]].strip()
-        fields.append(field)
+    return [line[start:end].strip() for start, end in spans]
 
-    return fields
+def summariseAllDataByPhase(result, majorFields, majorData, minorFields,
+                            minorData, categories, phase):
+    majorData = filterByPhase(majorFields, majorData, phase)
+    minorData = filterByPhase(minorFields, minorData, phase)
 
-def summariseAllDataByInTest(result, majorFields, majorData, minorFields,
-                             minorData, categories, inTest):
-    majorData = filterByInTest(majorFields, majorData, inTest)
-    minorData = filterByInTest(minorFields, minorData, inTest)
+    summariseAllData(result, majorFields, majorData, minorFields, minorData,
+                     categories, ' in ' + phase)
+
+class RuntimeGroup:
+    # The profile data for one runtime.
+    def __init__(self, pid, runtime):
+        self.pid = pid
+        self.runtime = runtime
+        self.majorData = list()
+        self.minorData = list()
+        self.role = None
+
+def groupByRuntime(majorData, minorData):
+    # Returns a map from (PID, runtime) to RuntimeGroup, in order of first
+    # appearance.
+    groups = dict()
+    for data, isMajor in ((majorData, True), (minorData, False)):
+        for fields in data:
+            key = (fields[0], fields[1])
+            group = groups.get(key)
+            if not group:
+                group = groups[key] = RuntimeGroup(*key)
+            if isMajor:
+                group.majorData.append(fields)
+            else:
+                group.minorData.append(fields)
+    return groups
+
+def mergeGroups(groups, majorData, minorData):
+    # Get the data for |groups| in log order.
+    kept = set()
+    for group in groups:
+        kept.update(map(id, group.majorData))
+        kept.update(map(id, group.minorData))
+    return ([fields for fields in majorData if id(fields) in kept],
+            [fields for fields in minorData if id(fields) in kept])
+
+def classifyRuntimes(majorFields, groups):
+    # Set the role of each runtime. A process's role comes from markers in the
+    # log if present. Otherwise a single process is the main process, and with
+    # several the first is assumed to be the parent and the rest content
+    # processes. In each process the runtime with the largest heap is the
+    # main runtime and the others are workers.
+    processes = dict()
+    for group in groups.values():
+        processes.setdefault(group.pid, []).append(group)
+
+    sizeField = majorFields.get('SizeKB') if majorFields else None
+
+    def heapSize(group):
+        if sizeField is None or not group.majorData:
+            return (0, len(group.minorData))
+        return (max(float(f[sizeField]) for f in group.majorData),
+                len(group.minorData))
+
+    for index, (pid, runtimes) in enumerate(processes.items()):
+        # The process type is the last field.
+        role = None
+        for group in runtimes:
+            for fields in group.majorData + group.minorData:
+                if fields[-1]:
+                    role = ProcessRoles.get(fields[-1], fields[-1].lower())
+                    break
+            if role:
+                break
+        if not role:
+            if len(processes) == 1:
+                role = 'main'
+            else:
+                role = 'parent' if index == 0 else 'content'
 
-    suffix = ' in test' if inTest else ' outside test'
+        mainRuntime = max(runtimes, key=heapSize)
+        for group in runtimes:
+            group.role = role if group is mainRuntime else WorkerRole
 
-    summariseAllData(result, majorFields, majorData, minorFields, minorData,
-                     categories, suffix)
+def summariseRuntimes(result, majorFields, minorFields, groups, categories):
+    roles = dict()
+    for group in groups.values():
+        roles.setdefault(group.role, []).append(group)
+
+    for role, runtimes in roles.items():
+        result[f'Runtime count in {role} runtimes'] = len(runtimes)
+        majorData = [f for group in runtimes for f in group.majorData]
+        minorData = [f for group in runtimes for f in group.minorData]
+        summariseAllData(result, majorFields, majorData, minorFields,
+                         minorData, categories, f' in {role} runtimes')
+
+        if len(runtimes) == 1:
+            continue
+
+        # PIDs differ between runs so rank runtimes by their GC time.
+        def gcTime(group):
+            return summariseData(majorFields, group.majorData)[1] + \
+                summariseData(minorFields, group.minorData)[1] / 1000
+
+        ranked = sorted(runtimes, key=gcTime, reverse=True)
+        for i, group in enumerate(ranked[:MaxRuntimesPerRole]):
+            summariseAllData(result, majorFields, group.majorData,
+                             minorFields, group.minorData, categories,
+                             f' in {role} runtime #{i + 1}')
 
 def summariseAllData(result,
                      majorFields,
@@ -297,17 +450,20 @@ def summariseMajorMinorData(result, majorFields, majorData, minorFields,
         result['Major GC slices' + keySuffix] = majorCount
         result['Major GC time' + keySuffix] = majorTime
         if majorCount:
-            result['Mean major GC slice time'] = majorTime / majorCount
+            result['Mean major GC slice time' + keySuffix] = \
+                majorTime / majorCount
 
     if 'minor' in categories:
         result['Minor GC count' + keySuffix] = minorCount
         result['Minor GC time' + keySuffix] = minorTime
         if minorCount:
-            result['Mean minor GC time'] = minorTime / minorCount
+            result['Mean minor GC time' + keySuffix] = minorTime / minorCount
 
     result['Total GC time' + keySuffix] = majorTime + minorTime
 
 def summariseData(fieldMap, data):
+    if not data:
+        return 0, 0
     reasonField = fieldMap['Reason']
     totalField = fieldMap['total']
     count = 0
@@ -387,13 +543,9 @@ def findMostActiveRuntimeByFrequency(data):
     assert mostActive
     return mostActive
 
-def filterByRuntime(data, runtime):
-    return list(
-        filter(lambda f: f[0] == runtime[0] and f[1] == runtime[1], data))
-
-def filterByInTest(fields, data, inTest):
-    i = fields['testNum']
-    return list(filter(lambda f: (f[i] != 0) == inTest, data))
+def filterByPhase(fields, data, phase):
+    i = fields['phase']
+    return list(filter(lambda f: f[i] == phase, data))
 
 def filterByReason(fields, data, reason):
     i = fields['Reason']
@@ -430,7 +582,7 @@ def findMax(fields, data, key):
 
 def calcMedian(fields, data, key):
     field = fields[key]
-    samples = list(map(lambda line: float(line[field]), data))
+    samples = sorted(map(lambda line: float(line[field]), data))
     count = len(samples)
     if count == 0:
         return 0
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+# Run a command and report its resource usage, like /usr/bin/time.
+#
+# Usage: launcher.py REPORT_FD -- COMMAND...
+#
+# On Linux a process's max RSS starts at that of the process that forked it, so
+# a benchmark forked directly by benchcomp would report at least benchcomp's
+# RSS. This script is small and is run with python -S -I, which keeps the floor
+# at a few MB.
+#
+# JSON lines are written to REPORT_FD: the child's PID once it has been
+# forked, an error if exec fails, and finally the child's wait status, elapsed
+# time and rusage. This is run as a separate script and only uses the standard
+# library.
+
+import os
+import sys
+import time
+
+def main():
+    reportFd = int(sys.argv[1])
+    if sys.argv[2] != '--' or len(sys.argv) < 4:
+        sys.exit("Usage: launcher.py REPORT_FD -- COMMAND...")
+    cmd = sys.argv[3:]
+
+    # Don't pass the report pipe on to the command.
+    os.set_inheritable(reportFd, False)
+
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.execvp(cmd[0], cmd)
+        except OSError as e:
+            report(reportFd, {'error': str(e)})
+        os._exit(127)
+
+    report(reportFd, {'pid': pid})
+    _, status, usage = os.wait4(pid, 0)
+    elapsed = time.perf_counter() - start
+    report(reportFd, {'status': status, 'elapsed': elapsed,
+                      'usage': list(usage)})
+
+def report(fd, data):
+    # Imported here so that the child is forked before json is loaded, which
+    # adds about 1MB to its max RSS.
+    import json
+    os.write(fd, (json.dumps(data) + '\n').encode())
+
+main()
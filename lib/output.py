@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+# Parse benchmark output into a map of results.
+
+import os
+import platform
+import re
+
+import android
+import gcprofile
+from perf import parsePerfOutput
+import selfprofile
+
+def parseOutput(stdout, stderr, args, profilePath):
+    results = dict()
+
+    for line in stdout.splitlines():
+        parseResultLine(results, line)
+
+    # if args.android:
+    #     results["Max CPU frequency"] = android.getMaxCpuFrequency()
+
+    if args.gc_profile:
+        assert profilePath
+        if args.android:
+            profileData = android.readProfile(profilePath)
+        else:
+            with open(profilePath) as f:
+                profileData = f.read()
+            os.remove(profilePath)
+        with selfprofile.phase('summarise GC profile'):
+            phaseMarkers = gcprofile.DefaultPhaseMarkers + \
+                getattr(args, 'gc_profile_phase', [])
+            gcprofile.summariseProfile(profileData, results, args.gc_profile,
+                                       False, phaseMarkers)
+
+    # Local runs get resource usage directly rather than from the time
+    # command.
+    if args.sys_usage and args.android:
+        parseSysUsage(results, stderr)
+
+    if args.perf:
+        parsePerfOutput(results, stdout, stderr, args)
+
+    return results
+
+def parseResultLine(results, line):
+    match = re.match(r'([\w\s-]+):\s+(\d+(:?\.\d+)?)', line)
+    if not match:
+        return
+
+    key, value = match.group(1), match.group(2)
+    key = '!' + key  # These are displayed first.
+    value = float(value)
+    if key not in results:
+        results[key] = []
+    results[key].append(value)
+
+def parseSysUsage(results, text):
+    for line in text.splitlines():
+        line = line.strip()
+        if line == "":
+            continue
+
+        if platform.system() == "Darwin":
+            parts = line.split()
+            if parts[1] == "real" and parts[3] == "user" and parts[5] == "sys":
+                addSysUsageResult(results, "Real time", parts[0])
+                addSysUsageResult(results, "User time", parts[2])
+                addSysUsageResult(results, "System time", parts[4])
+                continue
+            value = parts[0]
+            key = " ".join(parts[1:])
+        else:
+            key, value = line.split(": ")
+
+        addSysUsageResult(results, key, value)
+
+def addSysUsageResult(results, key, value):
+    if value.endswith("%"):
+        value = int(value[:-1])
+    elif ":" in value:
+        hours, minsAndSecs = value.split(":")
+        value = int(hours) * 60 + float(minsAndSecs)
+    elif re.match(r"\d+(\.\d+)?$", value):
+        value = float(value)
+    else:
+        return
+
+    if platform.system() == "Darwin" and "size" in key:
+        value = value / 1024
+        key += " (KB)"
+
+    results[key] = value
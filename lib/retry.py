@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+# Timeouts, retries and quarantine for benchmark runs.
+#
+# Unless a fixed timeout is given, each run's timeout is derived from the
+# longest successful run of the same test by any build, multiplied by a safety
+# factor. Until a test has run successfully a generous default is used.
+#
+# Failed runs are retried after a delay that doubles each time. A (build, test)
+# pair that fails several times in a row is quarantined and its remaining runs
+# are skipped, so that one broken configuration doesn't stop the others from
+# making progress.
+
+import asyncio
+import time
+
+from engine import BenchmarkError
+
+InitialTimeout = 600
+MinTimeout = 10
+RetryDelay = 1
+
+class RunPolicy:
+    def __init__(self, timeout=None, timeoutFactor=10, retries=2,
+                 maxFailures=3):
+        self.timeout = timeout
+        self.timeoutFactor = timeoutFactor
+        self.retries = retries
+        self.maxFailures = maxFailures
+        self.longestRun = dict()
+        self.consecutiveFailures = dict()
+        self.quarantined = set()
+
+    def timeoutFor(self, test):
+        if self.timeout:
+            return self.timeout
+        if test.name not in self.longestRun:
+            return InitialTimeout
+        return max(self.longestRun[test.name] * self.timeoutFactor, MinTimeout)
+
+    def isQuarantined(self, build, test):
+        return (build, test.name) in self.quarantined
+
+    async def run(self, build, test, runOnce, onFailure):
+        # Run a benchmark with runOnce(build, test, timeout), retrying on
+        # failure. onFailure(build, test, error, quarantined) is called for
+        # every failed attempt. Returns the results, or None if all attempts
+        # failed or the pair is quarantined.
+        pair = (build, test.name)
+        for attempt in range(self.retries + 1):
+            if pair in self.quarantined:
+                return None
+
+            if attempt != 0:
+                await asyncio.sleep(RetryDelay * 2**(attempt - 1))
+
+            start = time.perf_counter()
+            try:
+                results = await runOnce(build, test, self.timeoutFor(test))
+            except BenchmarkError as e:
+                failures = self.consecutiveFailures.get(pair, 0) + 1
+                self.consecutiveFailures[pair] = failures
+                if failures >= self.maxFailures:
+                    self.quarantined.add(pair)
+                onFailure(build, test, e, pair in self.quarantined)
+                continue
+
+            elapsed = time.perf_counter() - start
+            self.longestRun[test.name] = max(
+                elapsed, self.longestRun.get(test.name, 0))
+            self.consecutiveFailures[pair] = 0
+            return results
+
+        return None
+
+def makeRunPolicy(args):
+    return RunPolicy(args.timeout, args.timeout_factor, args.retries,
+                     args.max_failures)
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+# Resource usage of benchmark runs.
+#
+# Usage is the rusage returned by os.wait4 for the benchmark process, which
+# includes any children it waited for. Benchmarks are started through a small
+# launcher script that waits for them and reports this (see launcher.py), so
+# that their max RSS doesn't include benchcomp's. Results use the same keys and
+# units as we get from parsing the output of /usr/bin/time -v, with times in
+# seconds.
+#
+# Optionally each run can be placed in its own transient cgroup (v2 only) to
+# account for all processes it starts, including memory high water mark and IO.
+# This needs a cgroup directory the user can create child groups in, for
+# example one delegated by systemd-run --user --scope -p Delegate=yes.
+
+import itertools
+import json
+import os
+import os.path
+import platform
+import subprocess
+import sys
+
+LauncherPath = os.path.join(os.path.dirname(__file__), 'launcher.py')
+
+def maxRssKB(rusage):
+    # ru_maxrss is in bytes on macOS and KB elsewhere.
+    if platform.system() == "Darwin":
+        return rusage.ru_maxrss // 1024
+    return rusage.ru_maxrss
+
+def addRusageResults(results, rusage, elapsed):
+    maxrss = maxRssKB(rusage)
+    cpuTime = rusage.ru_utime + rusage.ru_stime
+    results['User time (seconds)'] = rusage.ru_utime
+    results['System time (seconds)'] = rusage.ru_stime
+    results['Elapsed (wall clock) time (seconds)'] = elapsed
+    if elapsed:
+        results['Percent of CPU this job got'] = round(cpuTime / elapsed * 100)
+    results['Maximum resident set size (kbytes)'] = maxrss
+    results['Major (requiring I/O) page faults'] = rusage.ru_majflt
+    results['Minor (reclaiming a frame) page faults'] = rusage.ru_minflt
+    results['Voluntary context switches'] = rusage.ru_nvcsw
+    results['Involuntary context switches'] = rusage.ru_nivcsw
+    results['Swaps'] = rusage.ru_nswap
+    results['File system inputs'] = rusage.ru_inblock
+    results['File system outputs'] = rusage.ru_oublock
+    results['Signals delivered'] = rusage.ru_nsignals
+
+def spawnWithLauncher(cmd, **kwargs):
+    # Start |cmd| through the launcher and return the launcher's Popen object
+    # and a LaunchReport for the command. Arguments are passed to Popen.
+    reportRead, reportWrite = os.pipe()
+    # -S and -I keep the launcher small by not loading site packages.
+    launcherCmd = [sys.executable, '-S', '-I', LauncherPath, str(reportWrite),
+                   '--'] + cmd
+    try:
+        proc = subprocess.Popen(launcherCmd, pass_fds=(reportWrite,), **kwargs)
+    except OSError:
+        os.close(reportRead)
+        raise
+    finally:
+        os.close(reportWrite)
+    return proc, LaunchReport(reportRead)
+
+class LaunchReport:
+    # Reads what the launcher reports about the command it ran. The status,
+    # elapsed time and usage are None if the launcher was killed first.
+    def __init__(self, fd):
+        self.file = os.fdopen(fd, 'rb')
+        self.pid = None
+        self.error = None
+        self.status = None
+        self.elapsed = None
+        self.usage = None
+
+    def readPid(self):
+        # Block until the command has been forked and return its PID, or None
+        # if the launcher exited first.
+        while self.pid is None and self.readLine():
+            pass
+        return self.pid
+
+    def readAll(self):
+        # Read the rest of the report once the launcher has exited. Raises
+        # OSError if the command couldn't be run.
+        while self.readLine():
+            pass
+        self.file.close()
+        if self.error:
+            raise OSError(self.error)
+
+    def readLine(self):
+        line = self.file.readline()
+        if not line:
+            return False
+        data = json.loads(line)
+        self.pid = data.get('pid', self.pid)
+        self.error = data.get('error', self.error)
+        if 'usage' in data:
+            # Imported here as it isn't available on Windows, which doesn't
+            # use the launcher.
+            import resource
+            self.status = data['status']
+            self.elapsed = data['elapsed']
+            self.usage = resource.struct_rusage(data['usage'])
+        return True
+
+def addCgroupResults(results, stats):
+    for key, value in stats.items():
+        results['cgroup ' + key] = value
+
+def findOwnCgroup():
+    # Get the cgroup v2 directory for this process, or None.
+    mountPoint = None
+    with open('/proc/self/mounts') as f:
+        for line in f:
+            fields = line.split()
+            if fields[2] == 'cgroup2':
+                mountPoint = fields[1]
+                break
+
+    path = None
+    with open('/proc/self/cgroup') as f:
+        for line in f:
+            if line.startswith('0::'):
+                path = line[3:].strip()
+
+    if mountPoint is None or path is None:
+        return None
+
+    return os.path.join(mountPoint, path.lstrip('/'))
+
+class CgroupFactory:
+    # Create transient cgroups under a parent group.
+    def __init__(self, parent):
+        self.parent = parent or findOwnCgroup()
+        self.counter = itertools.count()
+        self.checkedControllers = False
+        self.enabled = self.parent is not None
+        if not self.enabled:
+            self.disable("no cgroup v2 hierarchy found")
+            return
+
+        # Enable controllers for child groups if we can. This fails if the
+        # parent has processes in it, which is reported when the first group
+        # is created.
+        try:
+            with open(os.path.join(self.parent, 'cgroup.subtree_control'),
+                      'w') as f:
+                f.write('+memory +cpu +io')
+        except OSError:
+            pass
+
+    def create(self):
+        if not self.enabled:
+            return None
+
+        name = f"benchcomp-{os.getpid()}-{next(self.counter)}"
+        path = os.path.join(self.parent, name)
+        try:
+            os.mkdir(path)
+        except OSError as e:
+            self.disable(f"can't create cgroup in {self.parent}: {e}")
+            return None
+
+        if not self.checkedControllers:
+            self.checkControllers(path)
+        return Cgroup(path)
+
+    def checkControllers(self, path):
+        # Memory and IO stats are only available if their controllers are
+        # enabled for the group.
+        self.checkedControllers = True
+        try:
+            with open(os.path.join(path, 'cgroup.controllers')) as f:
+                controllers = f.read().split()
+        except OSError:
+            return
+        missing = [name for name in ('memory', 'io')
+                   if name not in controllers]
+        if missing:
+            print(f"Warning: not reporting cgroup {' or '.join(missing)} " +
+                  "stats: controllers not enabled in " +
+                  f"{self.parent}/cgroup.subtree_control", file=sys.stderr)
+
+    def disable(self, reason):
+        print(f"Warning: not using cgroups: {reason}", file=sys.stderr)
+        self.enabled = False
+
+class Cgroup:
+    def __init__(self, path):
+        self.path = path
+
+    def wrapCommand(self, cmd):
+        # Return a command that moves itself into the group and then runs
+        # |cmd|. This avoids using preexec_fn, which isn't safe when there are
+        # other threads.
+        procs = os.path.join(self.path, 'cgroup.procs')
+        return ['/bin/sh', '-c', 'echo $$ > "$1" && shift && exec "$@"', 'sh',
+                procs] + cmd
+
+    def readStats(self):
+        stats = dict()
+
+        peak = self.readFile('memory.peak')
+        if peak and peak.strip().isdigit():
+            stats['memory.peak (bytes)'] = int(peak)
+
+        cpu = self.readKeyValues('cpu.stat')
+        for key in ('usage_usec', 'user_usec', 'system_usec'):
+            if key in cpu:
+                stats[f'cpu.stat {key} (usec)'] = cpu[key]
+
+        io = self.readIOStats()
+        for key, name in (('rbytes', 'read (bytes)'),
+                          ('wbytes', 'written (bytes)'),
+                          ('rios', 'read operations'),
+                          ('wios', 'write operations')):
+            if key in io:
+                stats[f'io.stat {name}'] = io[key]
+
+        return stats
+
+    def readIOStats(self):
+        # Lines are of the form: <device> rbytes=N wbytes=N ...
+        totals = dict()
+        text = self.readFile('io.stat') or ''
+        for line in text.splitlines():
+            for field in line.split()[1:]:
+                key, _, value = field.partition('=')
+                if value.isdigit():
+                    totals[key] = totals.get(key, 0) + int(value)
+        return totals
+
+    def readKeyValues(self, name):
+        result = dict()
+        text = self.readFile(name) or ''
+        for line in text.splitlines():
+            parts = line.split()
+            if len(parts) == 2 and parts[1].isdigit():
+                result[parts[0]] = int(parts[1])
+        return result
+
+    def readFile(self, name):
+        try:
+            with open(os.path.join(self.path, name)) as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def remove(self):
+        try:
+            os.rmdir(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+# Sample the memory and CPU use of a running process (Linux only).
+#
+# A thread polls /proc/<pid>/status, smaps_rollup and stat at a fixed rate and
+# builds RSS, PSS and CPU time series for the run. These are summarised as
+# peak, time to peak and area under the curve so that changes in memory use
+# over time show up even if the peak doesn't move.
+#
+# The files are kept open and re-read with pread to keep the overhead low.
+# Reading smaps_rollup is the most expensive part as the kernel walks every
+# mapping, so PSS sampling can be turned off. An open smaps_rollup file keeps
+# reading the memory of the program that was running when it was opened, so it
+# is reopened when the process execs, e.g. when numactl starts the shell.
+#
+# Note that the process sampled is the one started, so wrappers such as perf
+# that fork the shell will be sampled instead of it.
+
+import json
+import os
+import threading
+import time
+
+class Sampler:
+    def __init__(self, rate, samplePss=True):
+        self.interval = 1 / rate
+        self.samplePss = samplePss
+        self.times = []
+        self.rss = []
+        self.pss = []
+        self.cpu = []
+        self.thread = None
+        self.stopping = threading.Event()
+
+    def start(self, pid):
+        self.pid = pid
+        self.files = dict()
+        try:
+            self.files['status'] = self.open('status')
+            self.files['stat'] = self.open('stat')
+            if self.samplePss:
+                self.exe = self.readExe()
+                self.files['smaps_rollup'] = self.open('smaps_rollup')
+        except OSError:
+            # Process already exited.
+            self.closeFiles()
+            return
+
+        self.startTime = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def open(self, name):
+        return os.open(f"/proc/{self.pid}/{name}", os.O_RDONLY)
+
+    def readExe(self):
+        return os.readlink(f"/proc/{self.pid}/exe")
+
+    def reopenSmapsIfExeChanged(self):
+        exe = self.readExe()
+        if exe != self.exe:
+            os.close(self.files.pop('smaps_rollup'))
+            self.files['smaps_rollup'] = self.open('smaps_rollup')
+            self.exe = exe
+
+    def stop(self):
+        if self.thread:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+        self.closeFiles()
+
+    def closeFiles(self):
+        for fd in self.files.values():
+            os.close(fd)
+        self.files = dict()
+
+    def run(self):
+        next = time.perf_counter()
+        while not self.stopping.is_set():
+            if not self.sample():
+                return
+            next += self.interval
+            delay = next - time.perf_counter()
+            if delay > 0:
+                self.stopping.wait(delay)
+
+    def sample(self):
+        # Returns False when the process has exited.
+        now = time.perf_counter() - self.startTime
+        try:
+            rss = readField(self.files['status'], b'VmRSS:')
+            cpu = readCpuTicks(self.files['stat'])
+            pss = None
+            if self.samplePss:
+                self.reopenSmapsIfExeChanged()
+                pss = readField(self.files['smaps_rollup'], b'Pss:')
+        except OSError:
+            return False
+
+        # Zombie processes have no memory fields.
+        if rss is None:
+            return False
+
+        self.times.append(now)
+        self.rss.append(rss)
+        self.cpu.append(cpu)
+        if self.samplePss:
+            self.pss.append(pss or 0)
+        return True
+
+    def addResults(self, results):
+        if len(self.times) < 2:
+            return
+
+        addSeriesResults(results, 'RSS', self.times, self.rss)
+        if self.samplePss:
+            addSeriesResults(results, 'PSS', self.times, self.pss)
+
+        duration = self.times[-1] - self.times[0]
+        if duration > 0:
+            ticks = os.sysconf('SC_CLK_TCK')
+            cpuTime = (self.cpu[-1] - self.cpu[0]) / ticks
+            results['Sampled mean CPU utilisation %'] = \
+                cpuTime / duration * 100
+
+    def timeline(self):
+        ticks = os.sysconf('SC_CLK_TCK')
+        return {
+            'time': self.times,
+            'rssKB': self.rss,
+            'pssKB': self.pss if self.samplePss else None,
+            'cpuSeconds': [c / ticks for c in self.cpu]
+        }
+
+    def writeTimeline(self, path):
+        with open(path, "w") as f:
+            json.dump(self.timeline(), f)
+
+def addSeriesResults(results, name, times, values):
+    peak = max(values)
+    peakTime = times[values.index(peak)]
+    area = 0
+    for i in range(1, len(times)):
+        area += (values[i] + values[i - 1]) / 2 * (times[i] - times[i - 1])
+    duration = times[-1] - times[0]
+
+    results[f'Sampled peak {name} / KB'] = peak
+    results[f'Time to peak {name} / s'] = peakTime
+    results[f'{name} area / KB*s'] = area
+    if duration > 0:
+        results[f'Time weighted mean {name} / KB'] = area / duration
+
+def readField(fd, name):
+    # Read a value in KB from a /proc file with lines like 'VmRSS:  1234 kB'.
+    text = os.pread(fd, 8192, 0)
+    start = text.find(name)
+    if start < 0:
+        return None
+    end = text.find(b'\n', start)
+    return int(text[start + len(name):end].split()[0])
+
+def readCpuTicks(fd):
+    # utime and stime are fields 14 and 15 of /proc/<pid>/stat. Skip past the
+    # command name as it may contain spaces.
+    text = os.pread(fd, 4096, 0)
+    fields = text[text.rfind(b')') + 2:].split()
+    return int(fields[11]) + int(fields[12])
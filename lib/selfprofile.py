@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+# Measure where benchcomp itself spends its time.
+#
+# Code wraps phases of work in phase(name) which records the count and total
+# time of each phase when enabled and does almost nothing otherwise. Benchmark
+# time is the time spent waiting for benchmark processes, and the duty cycle is
+# that as a fraction of the total wall time. Optionally cProfile and
+# tracemalloc can be used to find hot spots in the harness.
+#
+# Phases may nest and may run on different threads, so phase times can add up
+# to more than the wall time.
+
+import os
+import sys
+import threading
+import time
+
+Options = ('timers', 'cprofile', 'tracemalloc')
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.phases = dict()
+        self.benchmarkTime = 0
+        self.profiles = []
+        self.useTracemalloc = False
+        self.lock = threading.Lock()
+
+    def enable(self, options):
+        self.enabled = True
+        self.startTime = time.perf_counter()
+        self.useCProfile = 'cprofile' in options
+        self.useTracemalloc = 'tracemalloc' in options
+        if self.useTracemalloc:
+            import tracemalloc
+            tracemalloc.start()
+
+        startup = processAge()
+        if startup is not None:
+            self.phases['Python startup'] = [1, startup]
+            self.startTime -= startup
+
+        self.startThread()
+
+    def startThread(self):
+        # Before Python 3.12 cProfile only profiles the thread it's enabled on
+        # so this must be called on every thread of interest. From 3.12 a
+        # single profile covers all threads and only one can be enabled at a
+        # time.
+        if not self.enabled or not self.useCProfile:
+            return
+
+        import cProfile
+        with self.lock:
+            if sys.version_info >= (3, 12) and self.profiles:
+                return
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # Another profiler is active, e.g. the debugger's.
+                print(f"Warning: not profiling thread: {e}", file=sys.stderr)
+                return
+            self.profiles.append(profile)
+
+    def record(self, name, duration):
+        with self.lock:
+            entry = self.phases.setdefault(name, [0, 0])
+            entry[0] += 1
+            entry[1] += duration
+
+    def addBenchmarkTime(self, duration):
+        if self.enabled:
+            with self.lock:
+                self.benchmarkTime += duration
+
+    def report(self, file=sys.stderr):
+        if not self.enabled:
+            return
+
+        wallTime = time.perf_counter() - self.startTime
+        print("Harness self profile:", file=file)
+        print(f"  Wall time {wallTime:.2f} s, benchmark time " +
+              f"{self.benchmarkTime:.2f} s, duty cycle " +
+              f"{self.benchmarkTime / wallTime * 100:.1f}%",
+              file=file)
+        print("  %-28s  %8s  %9s  %9s  %6s" %
+              ("Phase", "Count", "Total s", "Mean ms", "% wall"),
+              file=file)
+        phases = sorted(self.phases.items(), key=lambda p: -p[1][1])
+        for name, (count, total) in phases:
+            print("  %-28s  %8d  %9.3f  %9.3f  %5.1f%%" %
+                  (name[:28], count, total, total / count * 1000,
+                   total / wallTime * 100),
+                  file=file)
+
+        if self.profiles:
+            import pstats
+            for profile in self.profiles:
+                profile.disable()
+            print(file=file)
+            print("Harness hot spots (cProfile):", file=file)
+            stats = pstats.Stats(*self.profiles, stream=file)
+            stats.sort_stats('tottime').print_stats(15)
+
+        if self.useTracemalloc:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            print(file=file)
+            print("Harness memory (tracemalloc): current " +
+                  f"{current // 1024} KB, peak {peak // 1024} KB",
+                  file=file)
+            for stat in snapshot.statistics('lineno')[:10]:
+                print(f"  {stat}", file=file)
+
+class Phase:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, type, value, traceback):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+class NullPhase:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+def processAge():
+    # Time since this process started, or None if unknown.
+    try:
+        with open('/proc/self/stat') as f:
+            stat = f.read()
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except OSError:
+        return None
+    fields = stat[stat.rfind(')') + 2:].split()
+    startTime = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    return max(uptime - startTime, 0)
+
+Current = Profiler()
+Null = NullPhase()
+
+def parseOptions(text):
+    options = text.split(',')
+    for option in options:
+        if option not in Options:
+            raise ValueError(f"Unknown self profile option: {option}")
+    return options
+
+def enable(options):
+    Current.enable(options)
+
+def startThread():
+    Current.startThread()
+
+def phase(name):
+    if not Current.enabled:
+        return Null
+    return Phase(Current, name)
+
+def addBenchmarkTime(duration):
+    Current.addBenchmarkTime(duration)
+
+def report(file=sys.stderr):
+    Current.report(file)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+# Stage shells and test files into a RAM backed cache before running them.
+#
+# Running from network or spinning disks adds noise when files drop out of the
+# page cache. Files are copied into a cache directory (by default on tmpfs) and
+# stored by content hash so that identical files are only stored once. Each
+# build or test gets a directory of hard links to these objects. Entries that
+# haven't been used recently are removed when the cache grows past its size
+# limit.
+
+import fnmatch
+import hashlib
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+
+DefaultSizeLimitMB = 2048
+
+SharedLibraryPatterns = ['*.so', '*.so.*', '*.dylib', '*.dll']
+
+def defaultCacheDir():
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm/benchcomp'
+    return os.path.join(tempfile.gettempdir(), 'benchcomp-stage')
+
+def stage(builds, tests, cacheDir, sizeLimitMB):
+    cache = Cache(cacheDir, sizeLimitMB * 1024 * 1024)
+
+    for build in builds:
+        build.shell = os.path.join(stageBuild(cache, build),
+                                   os.path.basename(build.shell))
+
+    stagedTests = 0
+    for test in tests:
+        dir = stageTest(cache, test)
+        if dir:
+            test.dir = dir
+            stagedTests += 1
+
+    cache.evict()
+    print(f"Staged {len(builds)} builds and {stagedTests} tests in {cacheDir}",
+          file=sys.stderr)
+
+def stageBuild(cache, build):
+    dir = os.path.dirname(build.shell)
+    files = [os.path.basename(build.shell)]
+    for name in sorted(os.listdir(dir)):
+        if name not in files and isSharedLibrary(name):
+            files.append(name)
+    return cache.stageFiles([(name, os.path.join(dir, name))
+                             for name in files])
+
+def isSharedLibrary(name):
+    return any(fnmatch.fnmatch(name, p) for p in SharedLibraryPatterns)
+
+def stageTest(cache, test):
+    files = []
+    size = 0
+    for dir, subdirs, names in os.walk(test.dir):
+        subdirs[:] = [d for d in subdirs if not d.startswith('.')]
+        for name in names:
+            path = os.path.join(dir, name)
+            if name.startswith('.') or not os.path.isfile(path):
+                continue
+            size += os.path.getsize(path)
+            if size > cache.sizeLimit:
+                print(f"Not staging test {test.name}: {test.dir} is larger " +
+                      "than the cache size limit", file=sys.stderr)
+                return None
+            files.append((os.path.relpath(path, test.dir), path))
+
+    return cache.stageFiles(files)
+
+class Cache:
+    def __init__(self, root, sizeLimit):
+        self.root = root
+        self.sizeLimit = sizeLimit
+        self.objectsDir = os.path.join(root, 'objects')
+        self.entriesDir = os.path.join(root, 'entries')
+        self.used = set()
+        os.makedirs(self.objectsDir, exist_ok=True)
+        os.makedirs(self.entriesDir, exist_ok=True)
+
+    def stageFiles(self, files):
+        # Stage a list of (relative path, source path) pairs and return the
+        # directory containing them.
+        objects = [(rel, self.addFile(src)) for rel, src in files]
+
+        hash = hashlib.sha256()
+        for rel, object in sorted(objects):
+            hash.update(f"{rel}\0{os.path.basename(object)}\0".encode())
+        key = hash.hexdigest()
+        entry = os.path.join(self.entriesDir, key)
+        self.used.add(key)
+
+        if os.path.isdir(entry):
+            os.utime(entry)
+            return entry
+
+        temp = tempfile.mkdtemp(dir=self.entriesDir, prefix='.tmp')
+        for rel, object in objects:
+            dest = os.path.join(temp, rel)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            try:
+                os.link(object, dest)
+            except OSError:
+                shutil.copy2(object, dest)
+
+        try:
+            os.rename(temp, entry)
+        except OSError:
+            # Another process staged the same files first.
+            shutil.rmtree(temp)
+        return entry
+
+    def addFile(self, src):
+        # Add a file to the object store and return its path there. The mode
+        # is part of the key so executables and data are kept apart.
+        mode = os.stat(src).st_mode & 0o777
+        name = f"{hashFile(src)}-{mode:o}"
+        object = os.path.join(self.objectsDir, name)
+        if not os.path.isfile(object):
+            fd, temp = tempfile.mkstemp(dir=self.objectsDir, prefix='.tmp')
+            os.close(fd)
+            shutil.copy2(src, temp)
+            os.rename(temp, object)
+        return object
+
+    def size(self):
+        total = 0
+        for name in os.listdir(self.objectsDir):
+            total += os.path.getsize(os.path.join(self.objectsDir, name))
+        return total
+
+    def evict(self):
+        # Remove the least recently used entries until the cache is under its
+        # size limit. Entries used by this session are never removed.
+        entries = []
+        for key in os.listdir(self.entriesDir):
+            path = os.path.join(self.entriesDir, key)
+            if key not in self.used:
+                entries.append((os.path.getmtime(path), path))
+        entries.sort()
+
+        size = self.size()
+        while size > self.sizeLimit and entries:
+            _, path = entries.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            size -= self.removeUnreferencedObjects()
+
+        if size > self.sizeLimit:
+            print("Warning: staged files exceed the cache size limit",
+                  file=sys.stderr)
+
+    def removeUnreferencedObjects(self):
+        removed = 0
+        for name in os.listdir(self.objectsDir):
+            path = os.path.join(self.objectsDir, name)
+            stat = os.stat(path)
+            if stat.st_nlink == 1 and not name.startswith('.tmp'):
+                os.remove(path)
+                removed += stat.st_size
+        return removed
+
+HashCache = dict()
+
+def hashFile(path):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in HashCache:
+        hash = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                hash.update(block)
+        HashCache[key] = hash.hexdigest()
+    return HashCache[key]
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+# Scripts and helpers for measuring shell startup time.
+#
+# Startup tests launch the shell many times per run on a tiny script and time
+# each launch from outside the process, so the results include process
+# creation, runtime initialisation, self-hosted code and the first compile.
+#
+# The scripts are generated into a cache directory. Bump ScriptVersion when
+# changing them so that cached copies are regenerated.
+#
+# By default a run starts with an untimed launch so that the page cache is
+# warm. With a cold page cache the shell, the files next to it (e.g. shared
+# libraries) and the script are evicted before every launch with
+# posix_fadvise. This only drops pages that aren't in use elsewhere and doesn't
+# need root, but isn't available on all platforms.
+
+import os
+import os.path
+import tempfile
+
+ScriptVersion = 1
+
+LargeModuleFunctions = 2000
+
+PageCacheModes = ('warm', 'cold')
+
+def cacheDir():
+    root = os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache'))
+    return os.path.join(root, 'benchcomp', 'startup')
+
+def emptyScript():
+    return ''
+
+def oneGlobalScript():
+    return 'var startupGlobal = {};\n'
+
+def largeModuleScript():
+    # A module with many exported functions and classes that must all be
+    # parsed, though few are run.
+    lines = []
+    for i in range(LargeModuleFunctions):
+        lines.append(f"export function f{i}(a, b) {{")
+        lines.append(f"  const items = [a, b, {i}, '{i}'];")
+        lines.append("  let total = 0;")
+        lines.append("  for (const item of items) {")
+        lines.append("    total += typeof item === 'number' ? item : item.length;")
+        lines.append("  }")
+        lines.append(f"  return {{ index: {i}, total, "
+                     f"next: f{(i + 1) % LargeModuleFunctions} }};")
+        lines.append("}")
+        if i % 10 == 0:
+            lines.append(f"export class C{i} {{")
+            lines.append(f"  constructor(x) {{ this.x = x; this.y = f{i}(x, x); }}")
+            lines.append(f"  get value() {{ return this.x + {i}; }}")
+            lines.append("}")
+    lines.append("export const table = {")
+    for i in range(0, LargeModuleFunctions, 7):
+        lines.append(f"  key{i}: [f{i}, {i}, 'value{i}'],")
+    lines.append("};")
+    lines.append("f0(1, 2);")
+    return "\n".join(lines) + "\n"
+
+# Map from test name to (file name, generator, whether it is a module).
+Scripts = {
+    'startup-empty': ('empty.js', emptyScript, False),
+    'startup-one-global': ('one-global.js', oneGlobalScript, False),
+    'startup-large-module': ('large-module.mjs', largeModuleScript, True),
+}
+
+def ensureScript(name):
+    # Generate a startup script if necessary and return its directory and file
+    # name.
+    fileName, generate, _ = Scripts[name]
+    dir = os.path.join(cacheDir(), f"v{ScriptVersion}")
+    path = os.path.join(dir, fileName)
+    if not os.path.isfile(path):
+        os.makedirs(dir, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=dir)
+        with os.fdopen(fd, 'w') as f:
+            f.write(generate())
+        os.replace(temp, path)
+    return dir, fileName
+
+def isModule(name):
+    return Scripts[name][2]
+
+def canEvictFromPageCache():
+    return hasattr(os, 'posix_fadvise')
+
+def filesToEvict(build, test):
+    # The shell, any files beside it and the test script.
+    dir = os.path.dirname(build.shell)
+    paths = [os.path.join(dir, name) for name in os.listdir(dir)]
+    paths.append(os.path.join(test.dir, test.script))
+    return [path for path in paths if os.path.isfile(path)]
+
+def evictFromPageCache(paths):
+    for path in paths:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
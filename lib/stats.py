@@ -3,13 +3,15 @@
 # Caclulate some basic statistics on a list of samples.
 
 import math
-from scipy import stats
 import statistics
 import warnings
 
 class Stats:
-    def __init__(self, samples):
+    def __init__(self, samples, blocks=None):
+        # If the samples were run in blocks, blocks gives the block of each
+        # sample and comparisons use paired differences.
         self.samples = samples
+        self.blocks = blocks
         self.count = len(samples)
         self.min = min(samples)
         self.max = max(samples)
@@ -42,7 +44,11 @@ def compareStats(a, b, key='mean'):
         factor = diff / y
 
     p = None
-    if a.count > 1 and b.count > 1 and a.mean != b.mean:
+    if a.blocks and b.blocks:
+        p = pairedPValue(a, b)
+    elif a.count > 1 and b.count > 1 and a.mean != b.mean:
+        # scipy is slow to import so only load it when it's needed.
+        from scipy import stats
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
             p = stats.ttest_ind(a.samples,
@@ -51,3 +57,58 @@ def compareStats(a, b, key='mean'):
                                 trim=0.2).pvalue
 
     return Comparison(diff, factor, p)
+
+# With this many blocks the sign-flip distribution is close to normal.
+NormalApproximationBlocks = 40
+
+# P-values are recomputed every time results are displayed, so cache them by
+# the differences they were computed from.
+PairedPValueCache = dict()
+PairedPValueCacheSize = 1000
+
+def pairedPValue(a, b):
+    # Sign-flip permutation test on the differences between the means of each
+    # block that both sets of samples have. This is exact for up to 13 pairs
+    # and uses random resampling or a normal approximation above that.
+    x = blockMeans(a)
+    y = blockMeans(b)
+    common = [block for block in x if block in y]
+    if len(common) < 2:
+        return None
+
+    diffs = tuple(x[block] - y[block] for block in common)
+    if all(d == 0 for d in diffs):
+        return None
+
+    if diffs in PairedPValueCache:
+        return PairedPValueCache[diffs]
+
+    if len(diffs) >= NormalApproximationBlocks:
+        # Under the null hypothesis the sum of the differences with random
+        # signs has mean zero and variance equal to the sum of their squares.
+        z = sum(diffs) / math.sqrt(sum(d * d for d in diffs))
+        p = math.erfc(abs(z) / math.sqrt(2))
+    else:
+        import numpy
+        from scipy import stats
+        result = stats.permutation_test(
+            (diffs,),
+            lambda d, axis: numpy.mean(d, axis=axis),
+            permutation_type='samples',
+            vectorized=True,
+            n_resamples=9999,
+            random_state=0)
+        p = result.pvalue
+
+    if len(PairedPValueCache) >= PairedPValueCacheSize:
+        PairedPValueCache.clear()
+    PairedPValueCache[diffs] = p
+    return p
+
+def blockMeans(stats):
+    # Result keys with several values per run have several samples per block.
+    sums = dict()
+    for sample, block in zip(stats.samples, stats.blocks):
+        total, count = sums.get(block, (0, 0))
+        sums[block] = (total + sample, count + 1)
+    return dict((block, total / count) for block, (total, count) in sums.items())
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+
+# Registry of known benchmark suites.
+#
+# Suites list the names of their tests up front so a test can be found by name
+# without touching the filesystem. Test objects are only created for the tests
+# that are actually run.
+#
+# Tests can be specified as:
+#   name          a test from any registered suite, e.g. splay or
+#                 startup-empty
+#   suite         all tests in a suite, e.g. jetstream
+#   suite:name    a test from a specific suite, e.g. jetstream:Air
+#   directory     all tests in a local directory suite
+#   path          a local JS file, optionally followed by arguments
+#
+# Additional suites can be added by setting BENCHCOMP_SUITES to a
+# colon-separated list of manifest files. A manifest is a JSON file like:
+#
+#   {
+#     "name": "mysuite",
+#     "dir": "path/to/tests",
+#     "tests": {
+#       "foo": {"script": "foo.js", "args": ["--quick"]},
+#       "bar": {"script": "bar.js"}
+#     }
+#   }
+#
+# where "dir" is relative to the manifest file. A directory containing a
+# manifest.json file in this format is loaded as a suite when passed as a test,
+# otherwise every .js file in it is a test.
+
+import json
+import os
+import os.path
+import sys
+
+from test import JetStreamTest, LocalTest, OctaneTest, StartupTest, Test
+
+ManifestEnvVar = 'BENCHCOMP_SUITES'
+ManifestFileName = 'manifest.json'
+
+class Suite:
+    # Subclasses provide createTest(name).
+    def __init__(self, name, testNames=[]):
+        self.name = name
+        self.testNames = testNames
+
+    def hasTest(self, name):
+        return name in self.testNames
+
+    def createAllTests(self):
+        return [self.createTest(name) for name in self.testNames]
+
+class OctaneSuite(Suite):
+    def __init__(self):
+        super().__init__('octane', [
+            # Run all tests sequentially in a single runtime.
+            'octane',
+
+            # Run individual tests independently.
+            'richards',
+            'deltablue',
+            'crypto',
+            'raytrace',
+            'earley-boyer',
+            'regexp',
+            'splay',
+            'navier-stokes',
+            'pdfjs',
+            'mandreel',
+            'gbemu',
+            'code-load',
+            'box2d',
+            'zlib',
+            'typescript'
+        ])
+
+    def createTest(self, name):
+        return OctaneTest(None if name == 'octane' else name)
+
+    def createAllTests(self):
+        return [OctaneTest()]
+
+class JetStreamSuite(Suite):
+    # The JetStream runner selects tests itself, so individual tests can only
+    # be found with a jetstream: prefix.
+    def __init__(self):
+        super().__init__('jetstream')
+
+    def createTest(self, name):
+        return JetStreamTest(name)
+
+    def createAllTests(self):
+        return [JetStreamTest()]
+
+class StartupSuite(Suite):
+    def __init__(self):
+        super().__init__('startup', [
+            'startup-empty',
+            'startup-one-global',
+            'startup-large-module'
+        ])
+
+    def createTest(self, name):
+        return StartupTest(name)
+
+class ManifestSuite(Suite):
+    def __init__(self, name, dir, tests):
+        super().__init__(name, list(tests.keys()))
+        self.dir = dir
+        self.tests = tests
+
+    def createTest(self, name):
+        entry = self.tests[name]
+        return Test(name, self.dir, entry['script'], entry.get('args', []))
+
+class DirectorySuite(Suite):
+    def __init__(self, dir):
+        names = sorted(
+            os.path.splitext(file)[0] for file in os.listdir(dir)
+            if file.endswith('.js'))
+        super().__init__(os.path.basename(os.path.normpath(dir)), names)
+        self.dir = dir
+
+    def createTest(self, name):
+        return Test(name, self.dir, name + '.js')
+
+def loadManifest(path):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        dir = os.path.join(os.path.dirname(os.path.abspath(path)),
+                           data.get('dir', '.'))
+        tests = data['tests']
+        if isinstance(tests, list):
+            tests = {os.path.splitext(t)[0]: {'script': t} for t in tests}
+        return ManifestSuite(data['name'], os.path.normpath(dir), tests)
+    except (OSError, ValueError, KeyError) as e:
+        sys.exit(f"Failed to load suite manifest {path}: {e}")
+
+BuiltinSuites = [OctaneSuite(), JetStreamSuite(), StartupSuite()]
+ExtraSuites = None
+
+def allSuites():
+    yield from BuiltinSuites
+
+    # Only read manifest files if we didn't find what we wanted in the
+    # built in suites.
+    global ExtraSuites
+    if ExtraSuites is None:
+        paths = os.environ.get(ManifestEnvVar, '')
+        ExtraSuites = [loadManifest(path) for path in paths.split(':') if path]
+    yield from ExtraSuites
+
+def findSuite(name):
+    for suite in allSuites():
+        if suite.name == name:
+            return suite
+    return None
+
+def defaultTests():
+    return BuiltinSuites[0].createAllTests()
+
+def findTests(spec):
+    if ':' in spec and not os.path.exists(spec.split(' ')[0]):
+        suiteName, name = spec.split(':', 1)
+        suite = findSuite(suiteName)
+        if not suite:
+            sys.exit(f"Unknown test suite: {suiteName}")
+        if suite.testNames and not suite.hasTest(name):
+            sys.exit(f"Unknown test in suite {suiteName}: {name}")
+        return [suite.createTest(name)]
+
+    for suite in allSuites():
+        if suite.hasTest(spec):
+            return [suite.createTest(spec)]
+
+    suite = findSuite(spec)
+    if suite:
+        return suite.createAllTests()
+
+    if os.path.isdir(spec):
+        manifest = os.path.join(spec, ManifestFileName)
+        if os.path.isfile(manifest):
+            return loadManifest(manifest).createAllTests()
+        return DirectorySuite(spec).createAllTests()
+
+    return [LocalTest(spec)]
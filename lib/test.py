@@ -3,8 +3,11 @@
 import os
 import os.path
 import sys
+import startup
 import utils
 
+JetStreamPath = 'third_party/webkit/PerformanceTests/JetStream2'
+
 class Test:
     def __init__(self, name, dir, script, args=[]):
         self.name = name
@@ -12,7 +15,7 @@ class Test:
         self.script = script
         self.args = args
         if not os.path.isfile(os.path.join(dir, script)):
-            sys.exit(f"Test script '${script}' not found in ${dir}")
+            sys.exit(f"Test script '{script}' not found in {dir}")
 
 class OctaneTest(Test):
     def __init__(self, name=None):
@@ -25,6 +28,20 @@ class OctaneTest(Test):
         dir = os.path.normpath(os.path.join(root, "js/src/octane"))
         super().__init__(name, dir, script)
 
+class JetStreamTest(Test):
+    def __init__(self, name=None):
+        root = utils.path_to_source_root()
+        dir = os.path.normpath(os.path.join(root, JetStreamPath))
+        args = [name] if name else []
+        super().__init__(name or 'jetstream', dir, 'cli.js', args)
+
+class StartupTest(Test):
+    # Measures shell startup time; see startup.py.
+    def __init__(self, name):
+        dir, script = startup.ensureScript(name)
+        super().__init__(name, dir, script)
+        self.isModule = startup.isModule(name)
+
 class LocalTest(Test):
     def __init__(self, spec):
         path, *args = spec.split(" ")
@@ -33,26 +50,3 @@ class LocalTest(Test):
             sys.exit(f"Test '{path}' not found")
         dir, name = os.path.split(os.path.abspath(path))
         super().__init__(spec, dir, name, args)
-
-def getKnownTests():
-    return [
-        # Run all tests sequentially in a single runtime.
-        OctaneTest(),
-
-        # Run individual tests independently.
-        OctaneTest('richards'),
-        OctaneTest('deltablue'),
-        OctaneTest('crypto'),
-        OctaneTest('raytrace'),
-        OctaneTest('earley-boyer'),
-        OctaneTest('regexp'),
-        OctaneTest('splay'),
-        OctaneTest('navier-stokes'),
-        OctaneTest('pdfjs'),
-        OctaneTest('mandreel'),
-        OctaneTest('gbemu'),
-        OctaneTest('code-load'),
-        OctaneTest('box2d'),
-        OctaneTest('zlib'),
-        OctaneTest('typescript')
-    ]
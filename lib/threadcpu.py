@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+# Measure the CPU time used by each thread of a running process (Linux only).
+#
+# Threads are polled through /proc/<pid>/task/*/ while the process runs as a
+# thread's counters disappear when it exits. CPU time is taken from schedstat
+# (nanoseconds) where available, falling back to utime + stime from stat
+# (clock ticks). Threads are grouped by name and the total CPU time and CPU
+# time / wall time (i.e. the number of cores used) are reported for each group.
+#
+# Time used by a thread between its last sample and its exit is missed, so the
+# error per thread is up to one sampling interval.
+
+import os
+import re
+import threading
+import time
+
+# Groups are matched in order. The main thread is the one whose ID is the
+# process ID. SpiderMonkey's JS Helper threads run GC tasks, off-thread
+# compilation and other work, so they are grouped together as helper threads
+# rather than counted as GC. The JIT compiler group only catches threads that
+# are named for compilation.
+DefaultThreadGroups = [
+    ('helper', r'JS Helper|GC|Mark|Sweep'),
+    ('JIT compiler', r'Ion|JIT|Baseline|Wasm'),
+]
+
+MainGroup = 'main'
+OtherGroup = 'other'
+
+def parseThreadGroup(spec):
+    # Parse a NAME=REGEX thread group.
+    name, sep, pattern = spec.partition('=')
+    if not sep or not name:
+        raise ValueError(f"Bad thread group: {spec}")
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"Bad thread group pattern: {e}")
+    return (name, pattern)
+
+class ThreadSampler:
+    def __init__(self, rate, groups=DefaultThreadGroups):
+        self.interval = 1 / rate
+        self.groups = [(name, re.compile(pattern)) for name, pattern in groups]
+        self.threads = dict()
+        self.thread = None
+        self.stopping = threading.Event()
+        self.useSchedstat = os.path.exists('/proc/self/schedstat')
+
+    def start(self, pid):
+        self.pid = pid
+        self.taskDir = f"/proc/{pid}/task"
+        self.startTime = time.perf_counter()
+        self.endTime = self.startTime
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+        for thread in self.threads.values():
+            thread.close()
+
+    def run(self):
+        next = time.perf_counter()
+        while not self.stopping.is_set():
+            if not self.sample():
+                return
+            self.endTime = time.perf_counter()
+            next += self.interval
+            delay = next - time.perf_counter()
+            if delay > 0:
+                self.stopping.wait(delay)
+
+    def sample(self):
+        # Returns False when the process has exited.
+        try:
+            tids = os.listdir(self.taskDir)
+        except OSError:
+            return False
+
+        for tid in tids:
+            thread = self.threads.get(tid)
+            if not thread:
+                try:
+                    thread = Thread(self.taskDir, tid, self.useSchedstat)
+                except OSError:
+                    continue  # Thread exited.
+                self.threads[tid] = thread
+            thread.sample()
+
+        return True
+
+    def groupFor(self, thread):
+        if thread.tid == str(self.pid):
+            return MainGroup
+        for name, pattern in self.groups:
+            if pattern.search(thread.name):
+                return name
+        return OtherGroup
+
+    def addResults(self, results):
+        wallTime = self.endTime - self.startTime
+        if not self.threads or wallTime <= 0:
+            return
+
+        names = [MainGroup] + [name for name, _ in self.groups] + [OtherGroup]
+        cpuTimes = dict((name, 0) for name in names)
+        counts = dict((name, 0) for name in names)
+        for thread in self.threads.values():
+            group = self.groupFor(thread)
+            cpuTimes[group] += thread.cpuTime
+            counts[group] += 1
+
+        for name in names:
+            if name == MainGroup:
+                label = 'main thread'
+            else:
+                label = f'{name} threads'
+                results[f'Thread count {label}'] = counts[name]
+            results[f'CPU time {label} / s'] = cpuTimes[name]
+            results[f'CPU / wall time {label}'] = cpuTimes[name] / wallTime
+
+        total = sum(cpuTimes.values())
+        results['CPU time all threads / s'] = total
+        results['CPU / wall time all threads'] = total / wallTime
+
+class Thread:
+    def __init__(self, taskDir, tid, useSchedstat):
+        self.tid = tid
+        self.name = ''
+        self.cpuTime = 0
+        self.statFd = os.open(f"{taskDir}/{tid}/stat", os.O_RDONLY)
+        self.schedstatFd = None
+        if useSchedstat:
+            self.schedstatFd = os.open(f"{taskDir}/{tid}/schedstat",
+                                       os.O_RDONLY)
+        self.ticks = os.sysconf('SC_CLK_TCK')
+
+    def sample(self):
+        # Keep the last values read once the thread has exited.
+        try:
+            stat = os.pread(self.statFd, 4096, 0)
+            if self.schedstatFd is not None:
+                schedstat = os.pread(self.schedstatFd, 256, 0)
+        except OSError:
+            return
+        if not stat:
+            return
+
+        # The name is in parentheses and may contain spaces.
+        start, end = stat.find(b'('), stat.rfind(b')')
+        self.name = stat[start + 1:end].decode(errors='replace')
+        if self.schedstatFd is not None:
+            self.cpuTime = int(schedstat.split()[0]) / 1e9
+        else:
+            fields = stat[end + 2:].split()
+            self.cpuTime = (int(fields[11]) + int(fields[12])) / self.ticks
+
+    def close(self):
+        os.close(self.statFd)
+        if self.schedstatFd is not None:
+            os.close(self.schedstatFd)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+# Search GC parameter settings for the best result.
+#
+# Each GC parameter dimension is given as a list of values (name=a,b,c) or a
+# range (name=low:high[:count]). Every combination of values is a candidate
+# configuration. Candidates are evaluated with successive halving: all are run
+# a few times, the best fraction are kept and run more, and so on until one
+# remains. Candidates that fail to run are dropped.
+#
+# With more than one objective candidates are ranked by Pareto front and ties
+# are broken by the first objective.
+
+import asyncio
+import copy
+import itertools
+import math
+import statistics
+
+from engine import BenchmarkError
+
+DefaultRangeCount = 4
+
+class Dimension:
+    def __init__(self, name, values):
+        self.name = name
+        self.values = values
+
+def isDimension(spec):
+    _, _, value = spec.partition('=')
+    return ',' in value or ':' in value
+
+def parseDimension(spec):
+    name, sep, value = spec.partition('=')
+    if not sep or not value:
+        raise ValueError(f"Bad GC parameter: {spec}")
+
+    if ':' in value:
+        return Dimension(name, expandRange(value))
+
+    return Dimension(name, value.split(','))
+
+def expandRange(text):
+    parts = text.split(':')
+    if len(parts) not in (2, 3):
+        raise ValueError(f"Bad GC parameter range: {text}")
+    count = int(parts[2]) if len(parts) == 3 else DefaultRangeCount
+    isInt = all(isInteger(p) for p in parts[:2])
+    low, high = float(parts[0]), float(parts[1])
+    if count < 2 or low >= high:
+        raise ValueError(f"Bad GC parameter range: {text}")
+
+    # Use a geometric series for ranges covering orders of magnitude.
+    geometric = low > 0 and high / low >= 10
+    values = []
+    for i in range(count):
+        t = i / (count - 1)
+        if geometric:
+            x = low * (high / low)**t
+        else:
+            x = low + (high - low) * t
+        x = str(round(x)) if isInt else f"{x:g}"
+        if x not in values:
+            values.append(x)
+    return values
+
+def isInteger(text):
+    try:
+        int(text)
+        return True
+    except ValueError:
+        return False
+
+class Objective:
+    # A result key to maximise or minimise, given as KEY[:max|:min]. Result
+    # keys starting with ! (benchmark scores) are maximised by default.
+    def __init__(self, spec):
+        key, sep, direction = spec.rpartition(':')
+        if not sep or direction not in ('max', 'min'):
+            key = spec
+            direction = 'max' if spec.startswith('!') else 'min'
+        self.key = key
+        self.maximise = direction == 'max'
+
+    def __repr__(self):
+        return f"{self.key}:{'max' if self.maximise else 'min'}"
+
+class Candidate:
+    def __init__(self, build, settings):
+        self.build = build
+        self.settings = settings
+        self.samples = dict()
+        self.runs = 0
+        self.error = None
+
+    def addResults(self, results):
+        self.runs += 1
+        for key, result in results.items():
+            values = result if isinstance(result, list) else [result]
+            self.samples.setdefault(key, []).extend(values)
+
+    def mean(self, objective):
+        samples = self.samples.get(objective.key)
+        if not samples:
+            return None
+        return statistics.mean(samples)
+
+    def score(self, objective):
+        # Objective value where higher is better.
+        mean = self.mean(objective)
+        if mean is None:
+            return -math.inf
+        return mean if objective.maximise else -mean
+
+def makeCandidates(build, dimensions):
+    candidates = []
+    names = [d.name for d in dimensions]
+    for values in itertools.product(*[d.values for d in dimensions]):
+        b = copy.deepcopy(build)
+        settings = list(zip(names, values))
+        for name, value in settings:
+            arg = f"--gc-param={name}={value}"
+            b.args.append(arg)
+            b.spec += " " + arg
+        candidates.append(Candidate(b, settings))
+    return candidates
+
+def dominates(a, b, objectives):
+    better = False
+    for objective in objectives:
+        x, y = a.score(objective), b.score(objective)
+        if x < y:
+            return False
+        if x > y:
+            better = True
+    return better
+
+def paretoRanks(candidates, objectives):
+    # Non-dominated sorting: rank 0 is the Pareto front.
+    ranks = dict()
+    remaining = list(candidates)
+    rank = 0
+    while remaining:
+        front = [
+            c for c in remaining
+            if not any(dominates(d, c, objectives) for d in remaining)
+        ]
+        for c in front:
+            ranks[c] = rank
+        remaining = [c for c in remaining if c not in ranks]
+        rank += 1
+    return ranks
+
+def rankCandidates(candidates, objectives):
+    ranks = paretoRanks(candidates, objectives)
+    return sorted(candidates,
+                  key=lambda c: (ranks[c], -c.score(objectives[0])))
+
+def paretoFront(candidates, objectives):
+    ranks = paretoRanks(candidates, objectives)
+    return rankCandidates([c for c in candidates if ranks[c] == 0],
+                          objectives)
+
+async def evaluate(candidates, runs, jobs, runOnce):
+    # Run each candidate until it has |runs| results, with up to |jobs| runs in
+    # parallel. |runOnce| is a coroutine taking a build and returning results.
+    semaphore = asyncio.Semaphore(jobs)
+
+    async def runCandidate(candidate):
+        while candidate.runs < runs and not candidate.error:
+            async with semaphore:
+                try:
+                    candidate.addResults(await runOnce(candidate.build))
+                except BenchmarkError as e:
+                    candidate.error = e
+
+    # Interleave runs across candidates rather than running each in turn.
+    await asyncio.gather(*[runCandidate(c) for c in candidates])
+
+async def successiveHalving(candidates,
+                            objectives,
+                            runOnce,
+                            budget=3,
+                            eta=3,
+                            jobs=1,
+                            onRung=None):
+    runs = budget
+    rung = 0
+    while True:
+        await evaluate(candidates, runs, jobs, runOnce)
+        failed = [c for c in candidates if c.error]
+        candidates = [c for c in candidates if not c.error]
+        ranked = rankCandidates(candidates, objectives)
+        keep = max(1, math.ceil(len(ranked) / eta))
+        if onRung:
+            onRung(rung, runs, ranked, failed, keep)
+        if keep == 1:
+            return ranked
+        candidates = ranked[:keep]
+        runs *= eta
+        rung += 1
@@ -1,8 +1,10 @@
+import functools
 import os
 import signal
 import sys
 
 # Attempt to find the root of the mozilla source tree.
+@functools.lru_cache(maxsize=None)
 def path_to_source_root():
     path = '.'
     depth = 0
@@ -15,6 +17,13 @@ def path_to_source_root():
             sys.exit('Please run from within the mozilla source tree')
     return os.path.normpath(path)
 
+# Parse HOST:PORT, where HOST defaults to localhost.
+def parseAddress(text):
+    host, sep, port = text.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError(f"Bad address, expected HOST:PORT: {text}")
+    return (host or 'localhost', int(port))
+
 class DelayedKeyboardInterrupt(object):
     # From https://stackoverflow.com/a/21919644
     def __enter__(self):
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+# Create a fake powercap tree for trying out --energy without RAPL counters.
+#
+# The tree has two sockets with package and DRAM zones plus zones that should
+# be ignored (core and intel-rapl-mmio). The package-0 and DRAM counters have
+# small ranges so that they wrap around every few seconds, which is still
+# longer than the meter's polling interval.
+#
+# With --check, drive an energy meter over the tree through several
+# wraparounds and check the totals. Otherwise advance the counters at a fixed
+# power for --seconds so that benchcomp can be run against the tree with
+# --energy --powercap-root DIR.
+
+import argparse
+import os
+import os.path
+import sys
+import tempfile
+import time
+
+LibDir = os.path.join(os.path.dirname(__file__), '..', 'lib')
+sys.path.insert(0, LibDir)
+
+import energy
+
+# Map from zone directory to (name, max_energy_range_uj, power in watts).
+Zones = {
+    'intel-rapl:0': ('package-0', 50000000, 20),
+    'intel-rapl:0:0': ('core', 10**12, 15),
+    'intel-rapl:0:1': ('dram', 20000000, 4),
+    'intel-rapl:1': ('package-1', 10**12, 10),
+    'intel-rapl-mmio:0': ('package-0', 10**12, 20),
+}
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Create a fake powercap tree for testing --energy')
+    parser.add_argument('--check',
+                        action='store_true',
+                        help='Check energy measurement against the tree')
+    parser.add_argument('--seconds',
+                        type=float,
+                        default=60,
+                        help='How long to advance the counters for')
+    parser.add_argument('dir', nargs='?', help='Where to create the tree')
+    args = parser.parse_args()
+
+    if args.check:
+        with tempfile.TemporaryDirectory() as dir:
+            check(dir)
+        return
+
+    if not args.dir:
+        sys.exit("No directory specified")
+    createTree(args.dir)
+    print(f"Advancing counters in {args.dir} for {args.seconds} seconds")
+    advanceCounters(args.dir, args.seconds)
+
+def createTree(root):
+    for zone, (name, maxRange, _) in Zones.items():
+        dir = os.path.join(root, zone)
+        os.makedirs(dir, exist_ok=True)
+        writeFile(dir, 'name', name)
+        writeFile(dir, 'max_energy_range_uj', maxRange)
+        writeFile(dir, 'energy_uj', 0)
+
+def setCounter(root, zone, value):
+    maxRange = Zones[zone][1]
+    writeFile(os.path.join(root, zone), 'energy_uj', value % maxRange)
+
+def advanceCounters(root, seconds, interval=0.01):
+    start = time.perf_counter()
+    while True:
+        elapsed = time.perf_counter() - start
+        for zone, (_, _, watts) in Zones.items():
+            setCounter(root, zone, round(elapsed * watts * 1e6))
+        if elapsed >= seconds:
+            return
+        time.sleep(interval)
+
+def check(root):
+    createTree(root)
+
+    if energy.Powercap(os.path.join(root, 'missing')).createMeter('t'):
+        sys.exit("Expected no meter for a missing tree")
+
+    # Poll by hand rather than from the meter's thread.
+    energy.PollInterval = 3600
+
+    # Start package-0 and DRAM close to the top of their ranges.
+    values = {zone: 0 for zone in Zones}
+    values['intel-rapl:0'] = 49000000
+    values['intel-rapl:0:1'] = 19000000
+    for zone, value in values.items():
+        setCounter(root, zone, value)
+
+    meter = energy.Powercap(root).createMeter('t')
+    meter.start()
+    steps = 4
+    for i in range(steps):
+        for zone, (_, _, watts) in Zones.items():
+            # A tenth of a second at the zone's power per step.
+            values[zone] += watts * 100000
+            setCounter(root, zone, values[zone])
+        meter.poll()
+    meter.stop()
+
+    results = dict()
+    meter.addResults(results)
+    expected = {
+        energy.energyKey('t', 'package'): steps * 3000000 / 1e6,
+        energy.energyKey('t', 'dram'): steps * 400000 / 1e6,
+    }
+    for key, value in expected.items():
+        if abs(results.get(key, 0) - value) > 1e-9:
+            sys.exit(f"Expected {key} to be {value}, got {results.get(key)}")
+    energyKeys = [key for key in results if key.endswith(' / J')]
+    if sorted(energyKeys) != sorted(expected.keys()):
+        sys.exit(f"Unexpected energy results: {energyKeys}")
+    print("OK")
+
+def writeFile(dir, name, value):
+    # Write atomically so that readers never see a partial value.
+    path = os.path.join(dir, name)
+    with open(path + '.tmp', 'w') as f:
+        f.write(f"{value}\n")
+    os.replace(path + '.tmp', path)
+
+main()